@@ -1,8 +1,22 @@
+import time
+
+# Start of this run, for the render time logged at its end
+RUN_STARTED = time.perf_counter()
+
+import io
 import os
-import pandas as pd
+import threading
 import streamlit as st
-import matplotlib.pyplot as plt
-from utils.nucleotide_analysis import analyze_sequence
+from streamlit.logger import get_logger
+from utils.parallel_scan import DEFAULT_WORKERS
+from utils.memory_cache import MemoryCache
+from utils.result_cache import ResultCache, file_content_hash
+from utils.analysis_jobs import SCAN_POOL, UPLOAD_POOL, AnalysisJob
+
+# Modules pulling in pandas, NumPy or matplotlib are imported by the functions and
+# branches that use them, so the upload page renders without loading them
+
+logger = get_logger(__name__)
 
 
 # Page configuration
@@ -18,6 +32,8 @@ def create_markers_csv():
     if not os.path.exists("data"):
         os.makedirs("data")
     if not os.path.exists(file_path):
+        import pandas as pd
+
         markers_data = {
             "Marker": ["ATCGT", "GCTAG", "TTAGC", "CCTGA", "AGGCT"],
             "Associated Risk": [0.8, 0.6, 0.7, 0.9, 0.5],
@@ -33,21 +49,374 @@ def create_markers_csv():
         markers_df.to_csv(file_path, index=False)
 
 
-# Call the function to ensure the markers CSV exists
-create_markers_csv()
+# Function to compile the marker panel and keep it up to date
+def start_panel_watcher():
+    from utils.nucleotide_analysis import watch_marker_panel
+
+    # The watcher compiles the panel once and recompiles it in the background whenever
+    # the CSV is edited, so every session shares one compiled panel
+    watch_marker_panel()
+
+
+# Function to bootstrap the app once per server process rather than on every rerun
+@st.cache_resource
+def initialize_app():
+    # Ensure the markers CSV exists, then compile the panel on a background thread so
+    # the first page does not wait for it; the first analysis picks it up when ready
+    started = time.perf_counter()
+    create_markers_csv()
+    threading.Thread(target=start_panel_watcher, name="panel-warmup", daemon=True).start()
+    return {"initialized_in": time.perf_counter() - started, "first_render": None}
+
+
+startup = initialize_app()
+
+
+# Maximum number of marker occurrences sent to the browser at once
+MAX_HIT_ROWS = 1000
+
+# Page sizes of the sequence viewer in bases; the browser only receives one page at a time
+VIEWER_WIDTHS = [600, 3000, 12000]
+
+# Limits of the in-memory stage caches shared by all sessions: each stage keeps at most
+# CACHE_MAX_ENTRIES results (one per upload and options), each for at most CACHE_TTL
+# seconds (a number, since Streamlit parses duration strings with pandas). These only
+# hold small results (detections, engine choices, charts, paths of memory-mapped
+# sequences); k-mer indexes and occurrence tables, whose size grows with the sequence,
+# share memory_cache, bounded to MEMORY_CACHE_MAX_BYTES in total
+CACHE_TTL = float(os.environ.get("DNA_CACHE_TTL", "3600"))
+CACHE_MAX_ENTRIES = int(os.environ.get("DNA_CACHE_MAX_ENTRIES", "32"))
+MEMORY_CACHE_MAX_BYTES = int(os.environ.get("DNA_MEMORY_CACHE_MAX_BYTES", str(2 << 30)))
+
+# Results shared by every session and kept across restarts, keyed by content hashes
+result_cache = ResultCache()
+
+
+# Large in-memory results shared by every session, kept once per server process
+@st.cache_resource
+def large_result_cache():
+    return MemoryCache(MEMORY_CACHE_MAX_BYTES)
+
+
+memory_cache = large_result_cache()
+
+# Seconds between progress bar updates while a background job runs
+JOB_POLL_INTERVAL = 0.2
+
+# Uploads above this size get a note that they are read in full before detections stream in
+LARGE_UPLOAD_BYTES = 64 << 20
 
 
 # Function to clean and validate DNA sequence
-def clean_and_validate_sequence(sequence: str) -> str:
-    # Remove headers (lines starting with '>') for FASTA files
-    lines = sequence.splitlines()
-    cleaned_sequence = "".join([line.strip() for line in lines if not line.startswith(">")])
-    
-    # Validate the sequence: Ensure it only contains A, T, C, and G
-    if not all(base in "ATCG" for base in cleaned_sequence.upper()):
-        raise ValueError("Invalid DNA sequence detected! Ensure the sequence contains only A, T, C, and G.")
-    
-    return cleaned_sequence.upper()
+def clean_and_validate_sequence(uploaded_file, progress=None) -> bytearray:
+    from utils.fasta_reader import read_fasta
+
+    # Stream the file in chunks, dropping FASTA headers and line breaks and validating
+    # that only A, T, C and G remain, straight into a single buffer
+    uploaded_file.seek(0)
+    return read_fasta(uploaded_file, progress=progress)
+
+
+# Function to open a private reader over an upload; jobs of different stages can run at
+# the same time, and a shared file position would let them read each other's chunks
+def upload_reader(uploaded_file):
+    return io.BytesIO(uploaded_file.getvalue())
+
+
+# Function to run an analysis stage as a background job, showing its progress
+def run_job(stage, key, label, function, show_partial=None, pool=SCAN_POOL):
+    # Each stage of a session has at most one job: a job for other inputs is cancelled,
+    # while reruns for the same inputs (e.g. moving the threshold) wait for the running one.
+    # Reading the upload runs on UPLOAD_POOL, so it never waits behind other sessions' scans
+    jobs = st.session_state.setdefault("analysis_jobs", {})
+    job = jobs.get(stage)
+    if job is None or job.key != key or job.cancelled:
+        if job is not None:
+            job.cancel()
+        job = jobs[stage] = AnalysisJob(key, function, pool)
+    if not job.done():
+        progress_bar = st.progress(0.0, text=label)
+        # Partial results the job reports are redrawn in place while it runs
+        partial_view = st.empty()
+        shown = None
+        while not job.done():
+            # Polling keeps the job alive; once the session is gone it cancels itself
+            job.touch()
+            progress_bar.progress(job.fraction, text=f"{label} {job.fraction:.0%}")
+            if show_partial is not None and job.partial is not shown:
+                shown = job.partial
+                with partial_view.container():
+                    show_partial(shown)
+            time.sleep(JOB_POLL_INTERVAL)
+        progress_bar.empty()
+        partial_view.empty()
+    return job.result()
+
+
+# Function to render the markers detected so far while the scan runs
+def show_partial_detections(update, user_threshold):
+    from utils.nucleotide_analysis import filter_markers
+
+    markers_so_far, _ = filter_markers(update["markers_detected"], user_threshold)
+    # Parallel chunks complete in any order, so this is the share scanned, not a prefix
+    scanned = update["bases_scanned"] / max(update["total_bases"], 1)
+    st.info(
+        f"🔎 {len(markers_so_far)} marker(s) above the threshold with {scanned:.0%} of the sequence scanned; "
+        f"running total risk score {update['total_risk']:.2f}."
+    )
+    if markers_so_far:
+        st.table(markers_so_far)
+
+
+# Function to hash an upload once per session (run as a background job); the hash keys
+# every cached stage below
+def upload_content_hash(uploaded_file) -> str:
+    if st.session_state.get("upload_id") != uploaded_file.file_id:
+        st.session_state["upload_id"] = uploaded_file.file_id
+        # A new upload stops the jobs still working on the previous one and opens the
+        # sequence viewer at its first base
+        for job in st.session_state.pop("analysis_jobs", {}).values():
+            job.cancel()
+        for key in ("viewer_start", "viewer_hit"):
+            st.session_state.pop(key, None)
+    if uploaded_file.size > LARGE_UPLOAD_BYTES:
+        st.caption(
+            "ℹ️ Large upload: the whole file is fingerprinted, validated and packed before the marker scan "
+            "starts, so the first detections appear only after those steps. Later analyses of the same file "
+            "reuse them."
+        )
+    return run_job(
+        "hash",
+        uploaded_file.file_id,
+        "🔑 Fingerprinting the upload...",
+        lambda progress: file_content_hash(upload_reader(uploaded_file), progress=progress),
+        pool=UPLOAD_POOL
+    )
+
+
+# Function to validate and pack an upload once per file content (run as a background job)
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def validated_sequence(_uploaded_file, upload_hash, _progress=None):
+    from utils.packed_sequence import load_stored_sequence, store_packed_sequence
+
+    # The result cache maps the upload's raw bytes to its packed sequence in the store,
+    # so the same file uploaded again, by anyone and after restarts, skips validation.
+    # The sequence is memory-mapped, so caching it only keeps its path in memory
+    upload_key = ("sequence", upload_hash)
+    content_hash = result_cache.get(upload_key)
+    packed_sequence = load_stored_sequence(content_hash) if content_hash else None
+    if packed_sequence is None:
+        packed_sequence = store_packed_sequence(clean_and_validate_sequence(_uploaded_file, _progress))
+        result_cache.put(upload_key, packed_sequence.content_hash)
+    return packed_sequence
+
+
+# Function to build an index over a sequence, shared by every session analyzing it
+# (run as a background job)
+def sequence_index_for(sequence, sequence_hash, index_choice, progress=None):
+    # The FM-index is also persisted, so it is only built once per sequence
+    def build_index():
+        if index_choice == "K-mer index":
+            from utils.kmer_index import KmerIndex
+
+            return KmerIndex.build(sequence, progress=progress)
+        from utils.fm_index import store_fm_index
+
+        return store_fm_index(sequence, progress=progress)
+
+    return memory_cache.get_or_compute(("index", sequence_hash, index_choice), build_index)
+
+
+# Function to tell the cost model which index it may use: "unavailable", "built", or
+# the kind of index that would have to be built first
+def index_build_state(sequence, index_choice, max_distance):
+    from utils.engine_selection import FM_INDEX, KMER_INDEX
+
+    if index_choice == "None" or max_distance:
+        return "unavailable"
+    if index_choice == "K-mer index":
+        return KMER_INDEX
+    from utils.fm_index import has_stored_fm_index
+
+    return "built" if has_stored_fm_index(sequence.content_hash) else FM_INDEX
+
+
+# Function to choose the detection engine once per sequence, panel, scan options and resources
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner="⚙️ Choosing the detection engine...")
+def engine_choice(_sequence, _panel, sequence_hash, panel_hash, scan_options, index_build, workers):
+    from utils.nucleotide_analysis import select_engine
+
+    # The cost model picks the engine among the index and cores made available; it is
+    # keyed by them, unlike the detections every engine agrees on
+    return select_engine(
+        _sequence,
+        _panel,
+        scan_options["both_strands"],
+        scan_options["max_distance"],
+        True if index_build != "unavailable" else None,
+        workers,
+        None if index_build in ("unavailable", "built") else index_build
+    )
+
+
+# Function to detect markers once per sequence, panel and scan options (run as a background job)
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def sequence_detections(_sequence, _panel, _engine_options, sequence_hash, panel_hash, scan_options, _progress=None):
+    from contextlib import closing
+    from utils.nucleotide_analysis import stream_markers
+
+    # Every engine finds the same markers, so the engine options are not part of the
+    # key; the on-disk result cache answers analyses already run before a restart
+    result_key = ("detections", sequence_hash, panel_hash, scan_options)
+    detections = result_cache.get(result_key)
+    if detections is not None:
+        return detections
+    # Stream the scan so the markers found so far can be shown chunk by chunk; closing the
+    # stream when the job is cancelled shuts down its worker pool
+    updates = stream_markers(_sequence, _panel, validated=True, **_engine_options, **scan_options)
+    with closing(updates):
+        for update in updates:
+            if _progress is not None:
+                _progress(update["bases_scanned"], update["total_bases"], update)
+    detections = update["markers_detected"]
+    result_cache.put(result_key, detections)
+    return detections
+
+
+# Function to detect markers in a background job, telling whether they were scanned or
+# served from one of the caches
+def scanned_detections(sequence, panel, engine_options, analysis_key, progress):
+    scanned = []
+
+    # Only an actual scan reports progress
+    def report(done, total, partial=None):
+        scanned.append(True)
+        progress(done, total, partial)
+
+    detections = sequence_detections(sequence, panel, engine_options, *analysis_key, report)
+    return detections, bool(scanned)
+
+
+# Function to locate every marker occurrence once per sequence, panel and scan options
+# (run as a background job)
+def sequence_occurrences(sequence, panel, engine_options, sequence_hash, panel_hash, scan_options, progress=None):
+    from utils.nucleotide_analysis import locate_markers
+
+    # Kept as NumPy columns sorted by position, so threshold changes are a cheap mask. The
+    # table is shared by every session rather than copied on each call, so it is only read
+    result_key = ("hits", sequence_hash, panel_hash, scan_options)
+    memory_key = ("hits", sequence_hash, panel_hash, tuple(sorted(scan_options.items())))
+    return memory_cache.get_or_compute(memory_key, lambda: result_cache.get_or_compute(
+        result_key,
+        lambda: locate_markers(
+            sequence,
+            panel,
+            validated=True,
+            index=engine_options["index"],
+            workers=engine_options["workers"],
+            progress=progress,
+            chunk_size=engine_options["chunk_size"],
+            **scan_options
+        ).sorted()
+    ))
+
+
+# Function to detect markers in every record of an upload once per panel and scan options
+# (run as a background job)
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def upload_record_detections(_uploaded_file, _panel, upload_hash, panel_hash, scan_options, _progress=None):
+    from utils.fasta_reader import iter_fasta_records
+    from utils.nucleotide_analysis import detect_records
+
+    # Records are detected one at a time as they are read from the file, which reports the progress
+    def detect_uploaded_records():
+        _uploaded_file.seek(0)
+        return detect_records(
+            iter_fasta_records(_uploaded_file, progress=_progress), _panel, validated=True, **scan_options
+        )
+
+    return result_cache.get_or_compute(("records", upload_hash, panel_hash, scan_options), detect_uploaded_records)
+
+
+# Function to render the top risks chart once per set of (description, risk) bars
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def top_risks_chart(top_risks):
+    from utils.visualizations import plot_top_risks, render_png
+
+    # Drawn on a private Agg figure that is closed once rendered; an unchanged chart is
+    # served from the cache without touching matplotlib
+    return render_png(plot_top_risks(
+        [{"Description": description, "Associated Risk": risk} for description, risk in top_risks]
+    ))
+
+
+# Function to render the risk threshold controls
+def risk_threshold_slider() -> float:
+    st.subheader("🎚️ Adjust Risk Threshold")
+    st.write("""
+        The **risk threshold** determines the minimum risk score a marker must have to be included in the results. 
+        - A higher threshold focuses on markers with stronger associations to risks.
+        - A lower threshold includes more markers, even those with moderate risk scores.
+    """)
+    return st.slider(
+        "Set the risk threshold (default is 0.5)", 
+        min_value=0.0, 
+        max_value=1.0, 
+        value=0.5, 
+        step=0.1, 
+        key="threshold_slider",
+        help="Adjust the threshold to refine the results based on the associated risk score."
+    )
+
+
+# Function to render one page of the validated sequence, with jump-to-hit navigation
+def sequence_viewer(sequence, panel, load_hits):
+    from utils.sequence_viewer import format_sequence_window, window_start_around
+
+    # Pages are sliced from the stored sequence on the server, so the payload stays the
+    # same size for a plasmid or a whole genome; load_hits is only called when jumping
+    start_column, width_column = st.columns(2)
+    width = width_column.selectbox("📏 Bases per page", VIEWER_WIDTHS, key="viewer_width")
+    start = start_column.number_input(
+        "📍 First base shown",
+        min_value=1,
+        max_value=max(len(sequence), 1),
+        step=width,
+        key="viewer_start",
+        help="Position (1-based) of the first base on the page; the arrows move one page."
+    )
+
+    highlight = None
+    if st.checkbox(
+        "🎯 Jump to a marker occurrence",
+        key="viewer_jump",
+        help="Center the page on an occurrence of a detected marker above the threshold, shown in lowercase."
+    ):
+        hits = load_hits().take(slice(0, MAX_HIT_ROWS))
+
+        def jump_to_hit():
+            row = st.session_state["viewer_hit"]
+            if row is not None:
+                st.session_state["viewer_start"] = window_start_around(
+                    int(hits.starts[row]), st.session_state["viewer_width"], len(sequence)
+                ) + 1
+
+        row = st.selectbox(
+            "Occurrence",
+            [None, *range(len(hits))],
+            format_func=lambda row: "Choose an occurrence..." if row is None else (
+                f"{panel.markers[hits.marker_ids[row]]} at {hits.starts[row] + 1:,} "
+                f"({'forward' if hits.strands[row] > 0 else 'reverse'})"
+            ),
+            key="viewer_hit",
+            on_change=jump_to_hit
+        )
+        if row is not None:
+            hit_start = int(hits.starts[row])
+            highlight = (hit_start, hit_start + panel.marker_length(int(hits.marker_ids[row])))
+
+    st.code(format_sequence_window(sequence, int(start) - 1, width, highlight), language="plain")
+    st.caption(f"Bases {int(start):,}-{min(int(start) - 1 + width, len(sequence)):,} of {len(sequence):,}.")
 
 
 # App title and instructions
@@ -71,87 +440,196 @@ uploaded_file = st.file_uploader(
     help="Upload your DNA sequence file here. Ensure it's in FASTA, TXT, or FNA format."
 )
 
-if uploaded_file:
+# Multi-FASTA handling
+per_record = st.checkbox(
+    "Analyze each FASTA record separately",
+    key="per_record_mode",
+    help="Treat every '>' record (sample or contig) as its own sequence instead of joining them, so markers are never matched across record boundaries."
+)
+
+# Strand selection
+both_strands = st.checkbox(
+    "Scan both strands",
+    key="both_strands_mode",
+    help="Also detect markers on the reverse strand (their reverse complement on the uploaded strand), found in the same pass over the sequence."
+)
+
+# Mismatch tolerance
+max_distance = st.number_input(
+    "Allowed mismatches per marker",
+    min_value=0,
+    max_value=3,
+    value=0,
+    step=1,
+    key="max_distance",
+    help="Also detect markers carrying up to this many sequencing errors or SNPs. 0 means exact matches only."
+)
+edit_distance = st.checkbox(
+    "Count insertions and deletions as mismatches",
+    key="edit_distance_mode",
+    disabled=max_distance == 0,
+    help="Use edit distance instead of only counting substituted bases."
+)
+
+# Sequence index for repeated queries
+INDEX_OPTIONS = ["None", "K-mer index", "FM-index (saved to disk)"]
+index_choice = st.selectbox(
+    "⚡ Index the sequence for repeated queries",
+    INDEX_OPTIONS,
+    key="index_choice",
+    help="Build an index over the uploaded sequence once, so re-running with other panels or options probes the index instead of rescanning. Used for exact matches. The FM-index answers each marker in time proportional to its length and is kept on disk for later sessions, which suits whole chromosomes."
+)
+
+# Parallel scanning; the results match a serial scan, so this is not part of any cache key
+parallel_scan = st.checkbox(
+    "🚀 Scan large sequences in parallel",
+    key="parallel_scan",
+    help=f"Split sequences of several million bases into overlapping chunks scanned by {DEFAULT_WORKERS} worker process(es)."
+)
+workers = DEFAULT_WORKERS if parallel_scan else 1
+
+# Options deciding what the scan detects; part of every cached detection's key
+scan_options = {"both_strands": both_strands, "max_distance": int(max_distance), "edit_distance": edit_distance}
+
+if uploaded_file and per_record:
+    from utils.nucleotide_analysis import filter_markers, load_marker_panel
+
+    try:
+        user_threshold = risk_threshold_slider()
+
+        # Detections are cached per file content and panel; moving the threshold only
+        # re-filters them
+        panel = load_marker_panel()
+        upload_hash = upload_content_hash(uploaded_file)
+        record_detections = run_job(
+            "records",
+            (upload_hash, panel.content_hash, scan_options),
+            "🔍 Detecting markers per record...",
+            lambda progress: upload_record_detections(
+                upload_reader(uploaded_file), panel, upload_hash, panel.content_hash, scan_options, progress
+            )
+        )
+        record_results = {
+            record_id: filter_markers(detections, user_threshold)
+            for record_id, detections in record_detections.items()
+        }
+
+        # Show per-record analysis results
+        st.subheader("📊 Analysis Results per Record")
+        st.info(f"ℹ️ {len(record_results)} record(s) validated and analyzed.")
+        for record_id, (markers_detected, risk_summary) in record_results.items():
+            with st.expander(f"🧬 {record_id}: {len(markers_detected)} marker(s) above the threshold"):
+                if markers_detected:
+                    st.table(markers_detected)
+                    st.write(f"**Total risk score of detected markers**: {risk_summary['Total Risk Score']:.2f}")
+                else:
+                    st.warning("⚠️ No markers detected above the threshold in this record.")
+    except ValueError as e:
+        st.error(f"🚨 {str(e)}")
+elif uploaded_file:
+    from utils.nucleotide_analysis import filter_markers, load_marker_panel
+
     try:
-        # Read the uploaded file and clean the sequence
-        raw_sequence = uploaded_file.read().decode("utf-8").strip()
-        cleaned_sequence = clean_and_validate_sequence(raw_sequence)
+        # Read the uploaded file, clean the sequence and pack it 2 bits per base into the
+        # shared on-disk store once per file content; reruns reuse the memory-mapped copy
+        upload_hash = upload_content_hash(uploaded_file)
+        cleaned_sequence = run_job(
+            "sequence",
+            upload_hash,
+            "🧬 Validating the sequence...",
+            lambda progress: validated_sequence(upload_reader(uploaded_file), upload_hash, progress),
+            pool=UPLOAD_POOL
+        )
 
-        # Display the cleaned DNA sequence
+        # Display the cleaned DNA sequence; the viewer is filled in once the markers it
+        # can jump to are known
         st.subheader("🧬 Validated DNA Sequence")
-        st.code(cleaned_sequence, language="plain")
+        viewer = st.container()
         st.info("ℹ️ The DNA sequence above has been validated and is ready for analysis.")
 
         # User threshold setting
-        st.subheader("🎚️ Adjust Risk Threshold")
-        st.write("""
-            The **risk threshold** determines the minimum risk score a marker must have to be included in the results. 
-            - A higher threshold focuses on markers with stronger associations to risks.
-            - A lower threshold includes more markers, even those with moderate risk scores.
-        """)
-        user_threshold = st.slider(
-            "Set the risk threshold (default is 0.5)", 
-            min_value=0.0, 
-            max_value=1.0, 
-            value=0.5, 
-            step=0.1, 
-            key="threshold_slider",
-            help="Adjust the threshold to refine the results based on the associated risk score."
+        user_threshold = risk_threshold_slider()
+
+        # Detect markers once per sequence, panel and scan options (the sequence was
+        # already validated while it was read); moving the threshold only re-filters them
+        panel = load_marker_panel()
+        analysis_key = (cleaned_sequence.content_hash, panel.content_hash, scan_options)
+        engine = engine_choice(
+            cleaned_sequence, panel, *analysis_key, index_build_state(cleaned_sequence, index_choice, max_distance), workers
         )
 
-        # Analyze the sequence
-        markers_detected, risk_summary = analyze_sequence(cleaned_sequence, user_threshold)
+        # The index is only built when the cost model picks it and the detections are not
+        # cached yet; it is built once per sequence and shared by every session analyzing it
+        sequence_index = None
+        if engine["options"]["index"] and not result_cache.contains(("detections", *analysis_key)):
+            sequence_index = run_job(
+                "index",
+                (cleaned_sequence.content_hash, index_choice),
+                "⚡ Indexing the sequence...",
+                lambda progress: sequence_index_for(
+                    cleaned_sequence, cleaned_sequence.content_hash, index_choice, progress
+                )
+            )
+        engine_options = dict(engine["options"], index=sequence_index)
+        detections, scanned = run_job(
+            "detections",
+            (analysis_key, index_choice, workers),
+            "🔍 Detecting markers...",
+            lambda progress: scanned_detections(cleaned_sequence, panel, engine_options, analysis_key, progress),
+            lambda update: show_partial_detections(update, user_threshold)
+        )
+        markers_detected, risk_summary = filter_markers(detections, user_threshold)
+
+        # Occurrences are located in a job of their own, only once the viewer or the
+        # occurrence table needs them, with every core the scan options allow
+        def load_occurrences():
+            return run_job(
+                "occurrences",
+                (analysis_key, index_choice, workers),
+                "📍 Locating occurrences...",
+                lambda progress: sequence_occurrences(
+                    cleaned_sequence, panel, dict(engine_options, workers=workers), *analysis_key, progress
+                )
+            )
+
+        with viewer:
+            sequence_viewer(
+                cleaned_sequence,
+                panel,
+                lambda: load_occurrences().above_threshold(panel.risks, user_threshold)
+            )
 
         # Show analysis results
         st.subheader("📊 Analysis Results")
+        if scanned:
+            st.caption(f"⚙️ Engine: {engine['reason']}")
+        else:
+            st.caption(
+                "⚙️ Detections served from the cache of an earlier analysis of this sequence; "
+                f"a new scan would use {engine['reason']}"
+            )
         if markers_detected:
             st.success(f"✅ {len(markers_detected)} marker(s) detected above the threshold.")
             st.write("**Detected Markers and Associated Risks**")
-            st.table(pd.DataFrame(markers_detected))
+            st.table(markers_detected)
+
+            # Positions of every occurrence, located once per sequence, panel and scan options
+            if st.checkbox(
+                "📍 Show every marker occurrence",
+                key="show_positions",
+                help="List the position (1-based, as in the sequence viewer) and strand of each occurrence of the detected markers."
+            ):
+                hits = load_occurrences().above_threshold(panel.risks, user_threshold)
+                st.write(f"**{len(hits)} occurrence(s)** of markers above the threshold.")
+                if len(hits) > MAX_HIT_ROWS:
+                    st.caption(f"Showing the first {MAX_HIT_ROWS} occurrences by position.")
+                st.dataframe(hits.to_frame(panel, limit=MAX_HIT_ROWS), hide_index=True)
 
             # Visualization: Top 3 risks
             top_markers = sorted(markers_detected, key=lambda x: x["Associated Risk"], reverse=True)[:3]
 
-            # Bar graph visualization of top 3 risks
-            def plot_top_risks(top_markers):
-                """
-                Visualizes the top 3 detected genetic risk factors for heart disease from uploaded DNA sequence analysis.
-                """
-                fig, ax = plt.subplots(figsize=(10, 6))  # Set the figure size
-
-                # Truncate long descriptions to ensure clarity
-                risks = [
-                    m["Description"][:20] + "..." if len(m["Description"]) > 20 else m["Description"] for m in top_markers
-                ]
-                scores = [m["Associated Risk"] for m in top_markers]
-
-                # Create bar graph
-                bars = ax.bar(risks, scores, color=["#FF6F61", "#6B8E23", "#4682B4"])
-
-                # Set graph details
-                ax.set_title(
-                    "Top 3 Detected Genetic Risk Factors for Heart Disease", fontsize=12
-                )
-                ax.set_xlabel("Risk Factors", fontsize=10)
-                ax.set_ylabel("Risk Score", fontsize=10)
-                ax.set_ylim(0, 1.0)
-
-                # Annotate scores
-                for bar, score in zip(bars, scores):
-                    ax.text(
-                        bar.get_x() + bar.get_width() / 2,
-                        bar.get_height() - 0.05 if bar.get_height() > 0.1 else bar.get_height() + 0.02,
-                        f"{score:.2f}",
-                        ha="center",
-                        fontsize=8,
-                    )
-
-                # Improve layout for visual clarity
-                fig.tight_layout()
-                return fig
-
             st.subheader("📉 Top 3 Risk Factors Visualization")
-            st.pyplot(plot_top_risks(top_markers))
+            st.image(top_risks_chart(tuple((m["Description"], m["Associated Risk"]) for m in top_markers)))
 
             # Explain the risks to users
             st.markdown("### 🩺 Explanation of Detected Risks")
@@ -163,3 +641,16 @@ if uploaded_file:
         st.error(f"🚨 {str(e)}")
 else:
     st.warning("📥 Please upload a DNA sequence file to begin the analysis.")
+
+
+# Log how long this run took; the first run of the process also pays for the imports
+# and initialization, which makes it the time to first render after a cold start
+render_seconds = time.perf_counter() - RUN_STARTED
+if startup["first_render"] is None:
+    startup["first_render"] = render_seconds
+    logger.info(
+        "Time to first render: %.0f ms (initialization %.0f ms)",
+        render_seconds * 1000, startup["initialized_in"] * 1000
+    )
+else:
+    logger.debug("Rendered in %.0f ms", render_seconds * 1000)
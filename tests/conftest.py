@@ -0,0 +1,9 @@
+import os
+import sys
+
+
+# The app and its utils package are run from the repository root, not installed
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Worker processes of the parallel scan import utils from a clean forkserver process
+os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))
@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+from utils.analysis_jobs import JobCancelled
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Runs app.py with st.file_uploader returning the upload in session state ((bytes, file id)).
+# Like a large upload, the file is read slowly, so jobs reading it overlap; the same file
+# object is returned on every rerun, as Streamlit does for an unchanged upload
+APP_SCRIPT = """
+import io
+import runpy
+import time
+import streamlit as st
+
+
+class Upload(io.BytesIO):
+    def __init__(self, data, file_id):
+        super().__init__(data)
+        self.size = len(data)
+        self.file_id = file_id
+        self.name = "sample.fasta"
+
+    def read(self, size=-1):
+        data = super().read(size)
+        time.sleep(len(data) / {bytes_per_second})
+        return data
+
+
+# Worker processes of the parallel scan import the main module under another name
+if __name__ == "__main__":
+    data, file_id = st.session_state["test_upload"]
+    if getattr(st.session_state.get("test_upload_file"), "file_id", None) != file_id:
+        st.session_state["test_upload_file"] = Upload(data, file_id)
+    st.file_uploader = lambda *args, **kwargs: st.session_state["test_upload_file"]
+    runpy.run_path({app_path!r}, run_name="__main__")
+"""
+
+# Speed at which the test upload is read
+UPLOAD_BYTES_PER_SECOND = 4 << 20
+
+# Bases of each record
+RECORD_LENGTH = 1_000_000
+
+# Markers of the default panel planted at the end of each record; the repeated background
+# contains none of them, so a record read only in part loses its marker
+PLANTED = {"r0": "ATCGT", "r1": "GCTAG", "r2": "CCTGA"}
+
+
+def fasta(records, line_width=80):
+    lines = []
+    for record_id, sequence in records.items():
+        lines.append(f">{record_id}")
+        lines += [sequence[start:start + line_width] for start in range(0, len(sequence), line_width)]
+    return ("\n".join(lines) + "\n").encode("ascii")
+
+
+def planted_records(length=RECORD_LENGTH):
+    background = "AAAC" * (length // 4)
+    return {record_id: background + marker for record_id, marker in PLANTED.items()}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # The app keeps its panel, stores and result cache under data/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    # Running the script makes it the main module, which later worker processes would import
+    monkeypatch.setitem(sys.modules, "__main__", sys.modules["__main__"])
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    script = APP_SCRIPT.format(app_path=os.path.join(ROOT, "app.py"), bytes_per_second=UPLOAD_BYTES_PER_SECOND)
+    return AppTest.from_string(script, default_timeout=300)
+
+
+# Rerun the app, giving up on each run after a moment as a user changing a widget would,
+# until a job of the given stage was started (or a run completes); the jobs keep running
+def start_jobs(app, stage):
+    for _ in range(100):
+        try:
+            app.run(timeout=0.5)
+        except RuntimeError:
+            pass
+        else:
+            break
+        if "analysis_jobs" in app.session_state and stage in app.session_state["analysis_jobs"]:
+            break
+    return dict(app.session_state["analysis_jobs"])
+
+
+def test_toggling_per_record_mode_while_the_upload_is_read(app):
+    records = planted_records()
+    app.session_state["test_upload"] = (fasta(records), "planted")
+    start_jobs(app, "sequence")
+
+    # The records job reads the upload while the sequence job may still be reading it too
+    app.session_state["per_record_mode"] = True
+    app.run()
+    assert not app.exception and not app.error
+    assert [expander.label for expander in app.expander] == [
+        f"🧬 {record_id}: 1 marker(s) above the threshold" for record_id in records
+    ]
+
+    app.session_state["per_record_mode"] = False
+    app.run()
+    assert not app.exception and not app.error
+    assert [success.value for success in app.success] == [f"{len(PLANTED)} marker(s) detected above the threshold."]
+    total = sum(len(sequence) for sequence in records.values())
+    assert any(caption.value.endswith(f" of {total:,}.") for caption in app.caption)
+
+
+def test_new_upload_cancels_the_jobs_of_the_previous_one(app):
+    app.session_state["test_upload"] = (fasta(planted_records()), "first")
+    jobs = start_jobs(app, "sequence")
+
+    small = {"r0": "AAAC" * 100 + "CCTGA"}
+    app.session_state["test_upload"] = (fasta(small), "second")
+    app.run()
+    assert not app.exception and not app.error
+    assert [success.value for success in app.success] == ["1 marker(s) detected above the threshold."]
+
+    for job in jobs.values():
+        assert job.cancelled
+        deadline = time.monotonic() + 60
+        while not job.done() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        # A cancelled job stops at its next progress report, unless it had already finished
+        if not job.future.cancelled():
+            assert job.future.exception() is None or isinstance(job.future.exception(), JobCancelled)
@@ -0,0 +1,248 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from utils.aho_corasick import (
+    ALPHABET, MarkerAutomaton, is_matchable_pattern, iter_substring_present, reverse_complement,
+    substring_find_present
+)
+from utils.approximate_matching import ApproximateMatcher
+from utils.fm_index import FMIndex
+from utils.kmer_index import KmerIndex
+from utils.marker_hits import FORWARD_STRAND, REVERSE_STRAND
+from utils.nucleotide_analysis import MarkerPanel, detect_markers, locate_markers
+from utils.packed_sequence import PackedSequence
+from utils.parallel_scan import parallel_find_all, parallel_find_present
+from utils.pwm_motifs import MotifScorer
+
+
+# Patterns no engine can match, mixed into every panel
+UNMATCHABLE = ["", None, "ACNT", "acgt", 7]
+
+SEEDS = range(5)
+
+
+def random_bases(rng, length, alphabet=ALPHABET):
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+# Short random sequence with a few Ns, and patterns drawn from it so most of them occur
+def sequence_and_patterns(seed, length=3000, pattern_count=24, with_n=True):
+    rng = random.Random(seed)
+    sequence = random_bases(rng, length, ALPHABET * 40 + "N" if with_n else ALPHABET)
+    patterns = []
+    for _ in range(pattern_count):
+        pattern_length = rng.randint(1, 16)
+        start = rng.randrange(length - pattern_length)
+        pattern = sequence[start:start + pattern_length]
+        patterns.append(pattern if rng.random() < 0.8 else random_bases(rng, pattern_length))
+    patterns += UNMATCHABLE
+    rng.shuffle(patterns)
+    return sequence, patterns
+
+
+# Brute-force scans every engine is checked against
+
+def brute_exact(sequence, patterns):
+    return {
+        (pattern_id, start)
+        for pattern_id, pattern in enumerate(patterns) if is_matchable_pattern(pattern)
+        for start in range(len(sequence) - len(pattern) + 1)
+        if sequence.startswith(pattern, start)
+    }
+
+
+def brute_mismatches(sequence, patterns, max_distance):
+    hits = set()
+    for pattern_id, pattern in enumerate(patterns):
+        if not is_matchable_pattern(pattern):
+            continue
+        for end in range(len(pattern), len(sequence) + 1):
+            window = sequence[end - len(pattern):end]
+            distance = sum(base != pattern_base for base, pattern_base in zip(window, pattern))
+            if distance <= max_distance and distance < len(pattern):
+                hits.add((pattern_id, end, distance))
+    return hits
+
+
+def brute_edits(sequence, patterns, max_distance):
+    hits = set()
+    for pattern_id, pattern in enumerate(patterns):
+        if not is_matchable_pattern(pattern):
+            continue
+        # Row i holds the fewest edits turning pattern[:i] into a substring ending at each position
+        row = list(range(len(pattern) + 1))
+        for end, base in enumerate(sequence, 1):
+            previous, row = row, [0]
+            for i, pattern_base in enumerate(pattern, 1):
+                row.append(min(previous[i - 1] + (base != pattern_base), previous[i] + 1, row[i - 1] + 1))
+            distance = row[-1]
+            if distance <= max_distance and distance < len(pattern):
+                hits.add((pattern_id, end, distance))
+    return hits
+
+
+def brute_motif_hits(sequence, marker_id, matrix, threshold):
+    hits = set()
+    for start in range(len(sequence) - len(matrix) + 1):
+        window = sequence[start:start + len(matrix)]
+        if "N" in window:
+            continue
+        # A reverse-strand site is a window whose reverse complement scores with the matrix
+        for strand, bases in ((FORWARD_STRAND, window), (REVERSE_STRAND, reverse_complement(window))):
+            if sum(matrix[offset][ALPHABET.index(base)] for offset, base in enumerate(bases)) >= threshold:
+                hits.add((marker_id, start, strand))
+    return hits
+
+
+def exact_hits(columns, patterns):
+    hit_ids, hit_ends = columns
+    return {(pattern_id, end - len(patterns[pattern_id])) for pattern_id, end in zip(hit_ids, hit_ends)}
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_automaton_matches_brute_force(seed):
+    sequence, patterns = sequence_and_patterns(seed)
+    automaton = MarkerAutomaton(patterns)
+    expected = brute_exact(sequence, patterns)
+    assert exact_hits(automaton.find_all(sequence, chunk_size=257), patterns) == expected
+    assert automaton.find_present(sequence, chunk_size=257) == {pattern_id for pattern_id, _ in expected}
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_substring_search_matches_brute_force(seed):
+    sequence, patterns = sequence_and_patterns(seed)
+    present = {pattern_id for pattern_id, _ in brute_exact(sequence, patterns)}
+    assert substring_find_present(patterns, sequence, chunk_size=257) == present
+    *_, (searched, found) = iter_substring_present(patterns, sequence, chunk_size=257)
+    assert searched == len(sequence) and found == present
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("max_distance", [1, 2])
+def test_approximate_matcher_matches_brute_force(seed, max_distance):
+    sequence, patterns = sequence_and_patterns(seed, length=600, with_n=False)
+    matcher = ApproximateMatcher(patterns, max_distance)
+    assert set(zip(*matcher.find_all(sequence, chunk_size=97))) == brute_mismatches(sequence, patterns, max_distance)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_edit_distance_matcher_matches_brute_force(seed):
+    sequence, patterns = sequence_and_patterns(seed, length=400, with_n=False)
+    matcher = ApproximateMatcher(patterns, 2, edit_distance=True)
+    assert set(zip(*matcher.find_all(sequence, chunk_size=97))) == brute_edits(sequence, patterns, 2)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("kmer_length", [4, 12])
+def test_kmer_index_matches_brute_force(seed, kmer_length):
+    sequence, patterns = sequence_and_patterns(seed)
+    index = KmerIndex.build(sequence, kmer_length)
+    expected = brute_exact(sequence, patterns)
+    for pattern_id, pattern in enumerate(patterns):
+        starts = sorted(start for hit_id, start in expected if hit_id == pattern_id)
+        assert index.positions_of(pattern).tolist() == starts
+        assert index.contains(pattern) == bool(starts)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_fm_index_matches_brute_force(seed, tmp_path):
+    sequence, patterns = sequence_and_patterns(seed)
+    built = FMIndex.build(sequence)
+    built.save(str(tmp_path / "index"))
+    expected = brute_exact(sequence, patterns)
+    for index in (built, FMIndex.load(str(tmp_path / "index"))):
+        for pattern_id, pattern in enumerate(patterns):
+            starts = sorted(start for hit_id, start in expected if hit_id == pattern_id)
+            assert index.positions_of(pattern).tolist() == starts
+            assert index.count(pattern) == len(starts)
+
+
+def test_fm_index_handles_repetitive_sequences():
+    sequence = "ACGT" * 300 + "A" * 500 + "ACGTN" * 20
+    patterns = ["ACGTACGT", "AAAA", "TA", "A" * 500, "CGTN", "A"]
+    index = FMIndex.build(sequence)
+    expected = brute_exact(sequence, patterns)
+    for pattern_id, pattern in enumerate(patterns):
+        assert index.positions_of(pattern).tolist() == sorted(start for hit_id, start in expected if hit_id == pattern_id)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_motif_scorer_matches_brute_force(seed):
+    rng = random.Random(seed)
+    sequence = random_bases(rng, 2000, ALPHABET * 40 + "N")
+    # Integer weights, so scores add up exactly in any order
+    matrices = [np.array([[rng.randint(-2, 2) for _ in ALPHABET] for _ in range(rng.randint(3, 8))], dtype=float)
+                for _ in range(3)]
+    thresholds = [len(matrix) for matrix in matrices]
+    scorer = MotifScorer([4, 7, 9], matrices, thresholds)
+    hits = scorer.locate(sequence, both_strands=True)
+    expected = set()
+    for marker_id, matrix, threshold in zip([4, 7, 9], matrices, thresholds):
+        expected |= brute_motif_hits(sequence, marker_id, matrix, threshold)
+    assert set(zip(hits.marker_ids.tolist(), hits.starts.tolist(), hits.strands.tolist())) == expected
+    assert scorer.find_present(sequence, both_strands=True) == {(marker_id, strand) for marker_id, _, strand in expected}
+
+
+@pytest.mark.parametrize("seed", SEEDS[:2])
+def test_parallel_scan_matches_serial_scan(seed):
+    sequence, patterns = sequence_and_patterns(seed, length=20000)
+    automaton = MarkerAutomaton(patterns)
+    expected = brute_exact(sequence, patterns)
+    assert exact_hits(parallel_find_all(automaton, sequence, workers=2, chunk_size=3001), patterns) == expected
+    present = {pattern_id for pattern_id, _ in expected}
+    assert parallel_find_present(automaton, sequence, workers=2, chunk_size=3001) == present
+
+    approximate_sequence = sequence.replace("N", "A")
+    matcher = ApproximateMatcher(patterns, 1)
+    assert set(zip(*parallel_find_all(matcher, approximate_sequence, workers=2, chunk_size=3001))) == set(
+        zip(*matcher.find_all(approximate_sequence))
+    )
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_packed_sequence_gives_the_same_hits(seed):
+    sequence, patterns = sequence_and_patterns(seed)
+    packed = PackedSequence.from_bytes(sequence)
+    assert packed.unpack() == sequence.encode("ascii")
+    expected = brute_exact(sequence, patterns)
+    assert exact_hits(MarkerAutomaton(patterns).find_all(packed, chunk_size=257), patterns) == expected
+    assert KmerIndex.build(packed).positions_of(patterns[0]).tolist() == KmerIndex.build(sequence).positions_of(
+        patterns[0]
+    ).tolist()
+    fm_index = FMIndex.build(packed)
+    for pattern_id, pattern in enumerate(patterns):
+        assert fm_index.count(pattern) == sum(hit_id == pattern_id for hit_id, _ in expected)
+    matcher = ApproximateMatcher(patterns, 1)
+    assert set(zip(*matcher.find_all(packed, chunk_size=257))) == set(zip(*matcher.find_all(sequence, chunk_size=257)))
+
+
+# Every engine locate_markers can use agrees on a panel of markers and a motif
+@pytest.mark.parametrize("seed", SEEDS[:3])
+def test_locate_markers_engines_agree(seed):
+    sequence, patterns = sequence_and_patterns(seed, length=5000, pattern_count=12, with_n=False)
+    markers = [pattern for pattern in patterns if is_matchable_pattern(pattern)]
+    panel = MarkerPanel(pd.DataFrame({
+        "Marker": markers + ["motif"],
+        "Associated Risk": [0.5] * (len(markers) + 1),
+        "Description": ["marker"] * (len(markers) + 1),
+        "Motif Matrix": [None] * len(markers) + ["2 -2 -2|-2 2 -2|-2 -2 2|-2 -2 -2"],
+        "Score Threshold": [None] * len(markers) + [6],
+    }))
+
+    def rows(hits):
+        return sorted(zip(hits.marker_ids.tolist(), hits.starts.tolist(), hits.strands.tolist()))
+
+    expected = sorted(
+        {(marker_id, start, FORWARD_STRAND) for marker_id, start in brute_exact(sequence, markers)}
+        | {(marker_id, start, REVERSE_STRAND) for marker_id, start in brute_exact(
+            sequence, [reverse_complement(marker) for marker in markers]
+        )}
+        | brute_motif_hits(sequence, len(markers), [[2, -2, -2, -2], [-2, 2, -2, -2], [-2, -2, 2, -2]], 6)
+    )
+    for options in ({}, {"workers": 2, "chunk_size": 1001}, {"index": KmerIndex.build(sequence)},
+                    {"index": FMIndex.build(sequence)}):
+        assert rows(locate_markers(sequence, panel, both_strands=True, **options)) == expected, options
+    detected = {marker["Marker"] for marker in detect_markers(sequence, panel, both_strands=True)}
+    assert detected == {panel.markers[marker_id] for marker_id, _, _ in expected}
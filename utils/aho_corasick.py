@@ -0,0 +1,290 @@
+from array import array
+
+
+ALPHABET = "ACGT"
+
+# Symbol used for any byte outside A/C/G/T; it sends the automaton back to the root
+RESET_SYMBOL = len(ALPHABET)
+NUM_SYMBOLS = len(ALPHABET) + 1
+
+# Translation table mapping raw sequence bytes to automaton symbols (A=0, C=1, G=2, T=3, other=4)
+SYMBOL_TABLE = bytes(
+    ALPHABET.index(chr(byte)) if chr(byte) in ALPHABET else RESET_SYMBOL
+    for byte in range(256)
+)
+
+# Complement of each base, for matching markers on the reverse strand
+_COMPLEMENT = str.maketrans(ALPHABET, "TGCA")
+
+# Default number of bases translated and scanned at a time
+SCAN_CHUNK_SIZE = 1 << 20
+
+ROOT_STATE = 0
+
+
+# Whether a marker can occur in a validated sequence at all: a non-empty string of A, C, G and T
+def is_matchable_pattern(pattern):
+    return isinstance(pattern, str) and bool(pattern) and not pattern.strip(ALPHABET)
+
+
+# Reverse complement of a marker
+def reverse_complement(pattern):
+    if not isinstance(pattern, str):
+        return pattern
+    return pattern.translate(_COMPLEMENT)[::-1]
+
+
+# Translate part of a sequence into automaton symbols
+def symbols_between(sequence, start, stop):
+    """
+    Returns bases [start, stop) of the sequence as automaton symbols.
+    Args:
+        sequence: DNA sequence as a str, bytes, bytearray or PackedSequence.
+        start: First base.
+        stop: End base (exclusive).
+    Returns:
+        bytes object holding one symbol (0-4) per base.
+    """
+    # Packed sequences decode straight to symbols without going through ASCII
+    if hasattr(sequence, "symbols"):
+        return sequence.symbols(start, stop)
+    chunk = sequence[start:stop]
+    if isinstance(chunk, str):
+        chunk = chunk.encode("ascii", errors="replace")
+    return bytes(chunk).translate(SYMBOL_TABLE)
+
+
+# Translate a sequence into automaton symbols, one chunk at a time
+def iter_symbol_chunks(sequence, chunk_size=SCAN_CHUNK_SIZE):
+    """
+    Yields the sequence as chunks of automaton symbols.
+    Args:
+        sequence: DNA sequence as a str, bytes, bytearray or PackedSequence.
+        chunk_size: Number of bases per chunk.
+    Returns:
+        Generator of bytes objects holding one symbol (0-4) per base.
+    """
+    for start in range(0, len(sequence), chunk_size):
+        yield symbols_between(sequence, start, start + chunk_size)
+
+
+# Find which patterns occur with one substring search per pattern
+def substring_find_present(patterns, sequence, wanted=None, chunk_size=SCAN_CHUNK_SIZE):
+    """
+    Returns the set of pattern ids occurring in the sequence, searching each pattern
+    with the bytes substring search. That runs at C speed, so for a handful of
+    markers it beats the automaton, but its cost grows with the number of patterns.
+    Args:
+        patterns: Patterns indexed by pattern id, as given to MarkerAutomaton.
+        sequence: DNA sequence as a str, bytes, bytearray or PackedSequence.
+        wanted: Pattern ids to look for (every pattern if omitted).
+        chunk_size: Number of bases translated and searched at a time.
+    """
+    found = set()
+    for _, found in iter_substring_present(patterns, sequence, wanted, chunk_size):
+        pass
+    return found
+
+
+# Substring search reporting the patterns found so far after every chunk
+def iter_substring_present(patterns, sequence, wanted=None, chunk_size=SCAN_CHUNK_SIZE):
+    """
+    Runs substring_find_present chunk by chunk, yielding (bases searched, set of
+    pattern ids found so far) after each chunk. It stops once every pattern was found.
+    """
+    remaining = {}
+    for pattern_id in range(len(patterns)) if wanted is None else wanted:
+        pattern = patterns[pattern_id]
+        if is_matchable_pattern(pattern):
+            remaining[pattern_id] = pattern.encode("ascii").translate(SYMBOL_TABLE)
+    # Keep the last (longest pattern - 1) symbols so matches across chunks are found
+    overlap = max(map(len, remaining.values()), default=1) - 1
+    found = set()
+    if not remaining or not len(sequence):
+        yield len(sequence), found
+        return
+    tail = b""
+    searched = 0
+    for symbols in iter_symbol_chunks(sequence, chunk_size):
+        window = tail + symbols
+        for pattern_id, pattern in list(remaining.items()):
+            if pattern in window:
+                found.add(pattern_id)
+                del remaining[pattern_id]
+        searched += len(symbols)
+        yield (searched if remaining else len(sequence)), set(found)
+        if not remaining:
+            return
+        tail = window[max(len(window) - overlap, 0):] if overlap else b""
+
+
+class MarkerAutomaton:
+    """
+    Aho-Corasick automaton matching a whole marker panel in one pass over a sequence.
+
+    Pattern ids are the positions of the patterns in the list given to the constructor.
+    Patterns that are empty or contain characters other than A, C, G and T can never
+    occur in a validated sequence and are skipped.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.pattern_lengths = [len(pattern) if isinstance(pattern, str) else 0 for pattern in self.patterns]
+        self.max_length = 0
+        # Ids of the patterns that can occur at all (i.e. were not skipped)
+        self.matchable_ids = set()
+
+        # Build the trie; each state is a row of NUM_SYMBOLS transitions (-1 = missing)
+        goto = [[-1] * NUM_SYMBOLS]
+        outputs = [[]]
+        for pattern_id, pattern in enumerate(self.patterns):
+            if not is_matchable_pattern(pattern):
+                continue
+            state = ROOT_STATE
+            for base in pattern:
+                symbol = ALPHABET.index(base)
+                if goto[state][symbol] == -1:
+                    goto[state][symbol] = len(goto)
+                    goto.append([-1] * NUM_SYMBOLS)
+                    outputs.append([])
+                state = goto[state][symbol]
+            outputs[state].append(pattern_id)
+            self.matchable_ids.add(pattern_id)
+            self.max_length = max(self.max_length, len(pattern))
+
+        # Breadth-first pass computing failure links and completing every transition,
+        # which turns the trie into a DFA so scanning never follows failure links
+        fail = [ROOT_STATE] * len(goto)
+        queue = []
+        for symbol in range(NUM_SYMBOLS):
+            child = goto[ROOT_STATE][symbol]
+            if child == -1 or symbol == RESET_SYMBOL:
+                goto[ROOT_STATE][symbol] = ROOT_STATE
+            else:
+                queue.append(child)
+        for state in queue:
+            outputs[state].extend(outputs[fail[state]])
+            for symbol in range(NUM_SYMBOLS):
+                child = goto[state][symbol]
+                if symbol == RESET_SYMBOL:
+                    goto[state][symbol] = ROOT_STATE
+                elif child == -1:
+                    goto[state][symbol] = goto[fail[state]][symbol]
+                else:
+                    fail[child] = goto[fail[state]][symbol]
+                    queue.append(child)
+
+        # Flatten into a single table indexed by (state offset + symbol); states are
+        # stored pre-multiplied by NUM_SYMBOLS to save a multiplication per base
+        self.num_states = len(goto)
+        self._delta = [target * NUM_SYMBOLS for row in goto for target in row]
+        self._outputs = [None] * (self.num_states * NUM_SYMBOLS)
+        for state, pattern_ids in enumerate(outputs):
+            if pattern_ids:
+                self._outputs[state * NUM_SYMBOLS] = tuple(sorted(pattern_ids))
+
+    def scan(self, symbols, hit_ids, hit_ends, state=ROOT_STATE, offset=0):
+        """
+        Finds every pattern occurrence in a chunk of symbols.
+        Args:
+            symbols: Bytes of automaton symbols (see iter_symbol_chunks).
+            hit_ids: array.array receiving the pattern id of each occurrence.
+            hit_ends: array.array receiving the end position (exclusive) of each occurrence.
+            state: Automaton state carried over from the previous chunk.
+            offset: Position of the first symbol within the whole sequence.
+        Returns:
+            Automaton state after the last symbol.
+        """
+        delta = self._delta
+        outputs = self._outputs
+        for index, symbol in enumerate(symbols, offset + 1):
+            state = delta[state + symbol]
+            if outputs[state]:
+                for pattern_id in outputs[state]:
+                    hit_ids.append(pattern_id)
+                    hit_ends.append(index)
+        return state
+
+    def scan_presence(self, symbols, state=ROOT_STATE, matched_states=None, remaining=None):
+        """
+        Records which output states are reached in a chunk of symbols.
+        Args:
+            symbols: Bytes of automaton symbols (see iter_symbol_chunks).
+            state: Automaton state carried over from the previous chunk.
+            matched_states: Set of output states collected so far, updated in place.
+            remaining: Set of pattern ids still to be found, updated in place; the
+                scan stops as soon as it is empty.
+        Returns:
+            matched_states: Set of output states reached.
+            state: Automaton state after the last symbol read.
+        """
+        delta = self._delta
+        outputs = self._outputs
+        if matched_states is None:
+            matched_states = set()
+        if remaining is None:
+            for symbol in symbols:
+                state = delta[state + symbol]
+                if outputs[state]:
+                    matched_states.add(state)
+            return matched_states, state
+
+        # Output states are reached for the first time at most num_states times,
+        # so checking for completion only then costs nothing per base
+        for symbol in symbols:
+            state = delta[state + symbol]
+            if outputs[state] and state not in matched_states:
+                matched_states.add(state)
+                remaining.difference_update(outputs[state])
+                if not remaining:
+                    break
+        return matched_states, state
+
+    def pattern_ids(self, matched_states):
+        """
+        Expands output states collected by scan_presence into pattern ids.
+        """
+        found = set()
+        for state in matched_states:
+            found.update(self._outputs[state])
+        return found
+
+    def find_present(self, sequence, chunk_size=SCAN_CHUNK_SIZE, wanted=None):
+        """
+        Returns the set of pattern ids occurring anywhere in the sequence. The scan
+        stops as soon as every wanted pattern has been seen, so on marker-rich
+        sequences it often reads only a fraction of the input.
+        Args:
+            sequence: DNA sequence as a str, bytes, bytearray or PackedSequence.
+            chunk_size: Number of bases translated and scanned at a time.
+            wanted: Pattern ids whose presence matters (every pattern if omitted);
+                others are still reported if seen before the scan stops.
+        """
+        remaining = set(self.matchable_ids if wanted is None else wanted) & self.matchable_ids
+        matched_states = set()
+        state = ROOT_STATE
+        for symbols in iter_symbol_chunks(sequence, chunk_size):
+            if not remaining:
+                break
+            matched_states, state = self.scan_presence(symbols, state, matched_states, remaining)
+        return self.pattern_ids(matched_states)
+
+    def find_all(self, sequence, chunk_size=SCAN_CHUNK_SIZE):
+        """
+        Returns every occurrence in the sequence as two columns, ordered by end position.
+        Args:
+            sequence: DNA sequence as a str, bytes, bytearray or PackedSequence.
+            chunk_size: Number of bases translated and scanned at a time.
+        Returns:
+            hit_ids: array.array of pattern ids.
+            hit_ends: array.array of end positions (exclusive); subtract pattern_lengths
+                to get the start.
+        """
+        hit_ids = array("q")
+        hit_ends = array("q")
+        state = ROOT_STATE
+        offset = 0
+        for symbols in iter_symbol_chunks(sequence, chunk_size):
+            state = self.scan(symbols, hit_ids, hit_ends, state, offset)
+            offset += len(symbols)
+        return hit_ids, hit_ends
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+# Threads running analysis jobs for every session, per pool; further jobs wait for a free
+# thread of their pool. Reading uploads (fingerprinting, validation) has a pool of its own,
+# so a small upload is not queued behind long scans from other sessions
+SCAN_POOL = "scan"
+UPLOAD_POOL = "upload"
+JOB_WORKERS = {
+    SCAN_POOL: int(os.environ.get("DNA_SCAN_JOB_WORKERS", "2")),
+    UPLOAD_POOL: int(os.environ.get("DNA_UPLOAD_JOB_WORKERS", "2")),
+}
+
+# A job whose session stopped polling it for this many seconds (e.g. the tab was
+# closed) is cancelled at its next progress report
+JOB_ABANDON_TIMEOUT = 10.0
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job's function by its progress callback once the job was cancelled.
+    """
+
+
+# Process-wide pools shared by the jobs of every session
+def _job_executor(pool):
+    with _executor_lock:
+        if pool not in _executors:
+            _executors[pool] = ThreadPoolExecutor(
+                max_workers=JOB_WORKERS[pool], thread_name_prefix=f"analysis-job-{pool}"
+            )
+        return _executors[pool]
+
+
+class AnalysisJob:
+    """
+    Runs a long analysis step (reading and validating an upload, scanning for
+    markers) on one of the shared job pools (SCAN_POOL or UPLOAD_POOL), so the
+    Streamlit script thread only polls it.
+
+    The function receives a progress callback taking (done, total), which it calls
+    after every chunk it processes (see read_fasta and detect_markers), optionally
+    with the partial result so far (e.g. a stream_markers update) for the session
+    to render while the job runs. The callback records them and raises JobCancelled once the job was cancelled, either
+    explicitly with cancel() or because nobody called touch() for
+    JOB_ABANDON_TIMEOUT seconds; the function then stops within one chunk.
+    """
+
+    def __init__(self, key, function, pool=SCAN_POOL):
+        self.key = key
+        self.fraction = 0.0
+        self.partial = None
+        self.last_seen = time.monotonic()
+        self._cancelled = threading.Event()
+        self.future = _job_executor(pool).submit(self._run, function)
+
+    def _run(self, function):
+        self._check()
+        return function(self.report)
+
+    def _check(self):
+        if time.monotonic() - self.last_seen > JOB_ABANDON_TIMEOUT:
+            self._cancelled.set()
+        if self._cancelled.is_set():
+            raise JobCancelled(f"Analysis job {self.key!r} was cancelled.")
+
+    def report(self, done, total, partial=None):
+        """
+        Progress callback handed to the job's function.
+        Args:
+            done: Units (bytes, bases) processed so far.
+            total: Total number of units, or None if unknown.
+            partial: Optional partial result, kept in the job's partial attribute.
+        Raises:
+            JobCancelled: If the job was cancelled or abandoned.
+        """
+        self._check()
+        if total:
+            self.fraction = min(done / total, 1.0)
+        if partial is not None:
+            self.partial = partial
+
+    def touch(self):
+        """
+        Marks the job as still watched by its session.
+        """
+        self.last_seen = time.monotonic()
+
+    def cancel(self):
+        """
+        Stops the job at its next progress report (or before it starts, if still queued).
+        """
+        self._cancelled.set()
+        self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        """
+        Returns the function's result, re-raising its exception (JobCancelled if it was cancelled).
+        """
+        try:
+            return self.future.result()
+        except CancelledError:
+            raise JobCancelled(f"Analysis job {self.key!r} was cancelled.") from None
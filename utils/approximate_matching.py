@@ -0,0 +1,136 @@
+from array import array
+
+import numpy as np
+from utils.aho_corasick import NUM_SYMBOLS, SCAN_CHUNK_SIZE, SYMBOL_TABLE, is_matchable_pattern, iter_symbol_chunks
+
+
+# Python integer with bit i set wherever a boolean array is True at i
+def _bits_to_int(flags):
+    return int.from_bytes(np.packbits(flags, bitorder="little").tobytes(), "little")
+
+
+class ApproximateMatcher:
+    """
+    Bit-parallel (Shift-And / Wu-Manber) matcher finding every pattern of a panel
+    with up to max_distance mismatches, or edits when edit_distance is True.
+
+    All patterns are laid side by side in one Python integer, so each base of the
+    sequence costs max_distance + 1 shift/and/or steps over the whole panel, each
+    growing with the panel's total length (one machine word per 64 bases). The
+    first bit of every pattern is forced on at each step, which also absorbs the
+    bit carried over from the end of the neighbouring pattern.
+
+    A pattern only reports hits with a distance smaller than its length, since a
+    pattern that may be wholly mismatched would match everywhere.
+    """
+
+    def __init__(self, patterns, max_distance, edit_distance=False):
+        self.patterns = list(patterns)
+        self.max_distance = max_distance
+        self.edit_distance = edit_distance
+        self.pattern_lengths = [len(pattern) if isinstance(pattern, str) else 0 for pattern in self.patterns]
+
+        # Every mask is built at once from the bit positions of the whole panel; setting
+        # one bit at a time on panel-wide integers would copy them for every base
+        ids = []
+        kept = []
+        for pattern_id, pattern in enumerate(self.patterns):
+            if not is_matchable_pattern(pattern):
+                continue
+            ids.append(pattern_id)
+            kept.append(pattern)
+        lengths = np.array([len(pattern) for pattern in kept], dtype=np.int64)
+        starts = np.cumsum(lengths) - lengths
+        last_bits = starts + lengths - 1
+        position = int(lengths.sum())
+        symbols = np.frombuffer("".join(kept).encode("ascii").translate(SYMBOL_TABLE), dtype=np.uint8)
+        # Offset of every bit within its pattern
+        offsets = np.arange(position, dtype=np.int64) - np.repeat(starts, lengths)
+
+        first = np.zeros(position, dtype=bool)
+        first[starts] = True
+        self._first = _bits_to_int(first)
+        self._masks = [_bits_to_int(symbols == symbol) for symbol in range(NUM_SYMBOLS)]
+        self._final = []
+        for distance in range(max_distance + 1):
+            final = np.zeros(position, dtype=bool)
+            final[last_bits[lengths > distance]] = True
+            self._final.append(_bits_to_int(final))
+        self._pattern_at_bit = dict(zip(last_bits.tolist(), ids))
+        self._deleted_prefixes = [0] + [_bits_to_int(offsets < distance) for distance in range(1, max_distance + 1)]
+        # Keeps shifted bits from running off the end of the last pattern
+        self._all_bits = (1 << position) - 1
+
+    def initial_state(self):
+        """
+        Returns the state before any base has been read. With edits allowed, the
+        first j bases of every pattern can already be deleted at distance j.
+        """
+        if self.edit_distance:
+            return list(self._deleted_prefixes)
+        return [0] * (self.max_distance + 1)
+
+    def scan(self, symbols, hit_ids, hit_ends, hit_distances, state=None, offset=0):
+        """
+        Finds every approximate occurrence in a chunk of symbols.
+        Args:
+            symbols: Bytes of automaton symbols (see iter_symbol_chunks).
+            hit_ids: array.array receiving the pattern id of each occurrence.
+            hit_ends: array.array receiving the end position (exclusive) of each occurrence.
+            hit_distances: array.array receiving the distance of each occurrence.
+            state: State carried over from the previous chunk (initial_state() if omitted).
+            offset: Position of the first symbol within the whole sequence.
+        Returns:
+            State after the last symbol.
+        """
+        rows = list(state) if state is not None else self.initial_state()
+        first = self._first
+        masks = self._masks
+        final = self._final
+        any_final = 0
+        for distance_final in final:
+            any_final |= distance_final
+        all_bits = self._all_bits
+        levels = range(1, len(rows))
+        edit_distance = self.edit_distance
+
+        for position, symbol in enumerate(symbols, offset + 1):
+            mask = masks[symbol]
+            previous = rows[0]
+            rows[0] = ((previous << 1) | first) & mask
+            for level in levels:
+                current = rows[level]
+                # Match, or substitute this base for the pattern base
+                updated = (((current << 1) | first) & mask) | (previous << 1) | first
+                if edit_distance:
+                    # Insert the base into the pattern, or skip a pattern base
+                    updated |= previous | (rows[level - 1] << 1)
+                rows[level] = updated & all_bits
+                previous = current
+
+            # Rows only grow with the distance, so the last row tells whether anything matched
+            matched = rows[-1] & any_final
+            while matched:
+                bit = matched & -matched
+                matched ^= bit
+                distance = 0
+                while not rows[distance] & bit:
+                    distance += 1
+                if not final[distance] & bit:
+                    continue
+                hit_ids.append(self._pattern_at_bit[bit.bit_length() - 1])
+                hit_ends.append(position)
+                hit_distances.append(distance)
+        return rows
+
+    def find_all(self, sequence, chunk_size=SCAN_CHUNK_SIZE):
+        """
+        Returns every approximate occurrence as (pattern ids, end positions, distances) columns.
+        """
+        hit_ids, hit_ends, hit_distances = array("q"), array("q"), array("b")
+        state = self.initial_state()
+        offset = 0
+        for symbols in iter_symbol_chunks(sequence, chunk_size):
+            state = self.scan(symbols, hit_ids, hit_ends, hit_distances, state, offset)
+            offset += len(symbols)
+        return hit_ids, hit_ends, hit_distances
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+
+
+# Leading bytes of the columnar panel formats
+PARQUET_MAGIC = b"PAR1"
+ARROW_MAGIC = b"ARROW1"
+
+
+# Tell a columnar panel file apart from a CSV by its leading bytes
+def columnar_format(head):
+    """
+    Returns "parquet" or "arrow" for the first bytes of a columnar panel file, None otherwise.
+    """
+    if head.startswith(PARQUET_MAGIC):
+        return "parquet"
+    if head.startswith(ARROW_MAGIC):
+        return "arrow"
+    return None
+
+
+# Read a Parquet or Arrow IPC marker panel through a memory map
+def read_columnar_panel(file_path, panel_format):
+    """
+    Loads a columnar marker panel without parsing text.
+    Args:
+        file_path: Path to a file written by write_columnar_panel.
+        panel_format: "parquet" or "arrow", as returned by columnar_format.
+    Returns:
+        DataFrame whose risks stay float32 and whose dictionary-encoded descriptions
+        become a Categorical, so neither column holds a Python object per marker.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if panel_format == "parquet":
+        table = pq.read_table(file_path, memory_map=True)
+    else:
+        # Arrow IPC buffers point straight into the mapped file
+        table = pa.ipc.open_file(pa.memory_map(file_path)).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+# Write a marker panel in a columnar format
+def write_columnar_panel(markers_df, file_path):
+    """
+    Writes a marker panel with float32 risks and dictionary-encoded descriptions,
+    replacing the file atomically.
+    Args:
+        markers_df: DataFrame with Marker, Associated Risk and Description columns, and
+            optionally the Motif Matrix and Score Threshold of PWM motifs.
+        file_path: Destination; a .arrow or .feather suffix writes Arrow IPC, anything else Parquet.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.table({
+        "Marker": pa.array(np.asarray(markers_df["Marker"], dtype=object), type=pa.string()),
+        "Associated Risk": pa.array(np.asarray(markers_df["Associated Risk"], dtype=np.float32)),
+        "Description": pa.array(np.asarray(markers_df["Description"], dtype=object), type=pa.string()).dictionary_encode(),
+    })
+    # Optional PWM motif columns
+    if "Motif Matrix" in markers_df.columns:
+        table = table.append_column("Motif Matrix", pa.array(
+            np.asarray(markers_df["Motif Matrix"], dtype=object), type=pa.string(), from_pandas=True
+        ))
+    if "Score Threshold" in markers_df.columns:
+        table = table.append_column("Score Threshold", pa.array(
+            np.asarray(markers_df["Score Threshold"], dtype=np.float64)
+        ))
+    temp_path = f"{file_path}.tmp{os.getpid()}"
+    if os.path.splitext(file_path)[1] in (".arrow", ".feather"):
+        with pa.OSFile(temp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, temp_path)
+    os.replace(temp_path, file_path)
@@ -0,0 +1,207 @@
+import logging
+import math
+import random
+import threading
+import time
+from array import array
+from collections import Counter
+
+from utils.aho_corasick import ALPHABET, RESET_SYMBOL, SYMBOL_TABLE, MarkerAutomaton, iter_symbol_chunks
+from utils.approximate_matching import ApproximateMatcher
+from utils.fm_index import FMIndex
+from utils.kmer_index import KmerIndex
+from utils.parallel_scan import PARALLEL_CHUNK_SIZE, worker_pool
+
+
+AUTOMATON_ENGINE = "automaton"
+SUBSTRING_ENGINE = "substring"
+INDEX_ENGINE = "index"
+PARALLEL_ENGINE = "parallel"
+
+# Kinds of sequence index the index engine can probe
+KMER_INDEX = "kmer"
+FM_INDEX = "fm"
+
+# Size of the synthetic sequence and panel timed by the calibration micro-benchmark
+BENCHMARK_LENGTH = 1 << 16
+BENCHMARK_MARKERS = 16
+BENCHMARK_MARKER_LENGTH = 10
+
+# Wider panel timed on a shorter sequence, so the bit-parallel matcher's cost is modelled
+# as a fixed cost per base plus a cost growing with the panel width
+BENCHMARK_WIDE_MARKERS = 1024
+BENCHMARK_WIDE_LENGTH = 1 << 12
+
+# Seconds of scanning aimed for per chunk, i.e. between progress reports and cancellation
+# checks, and the smallest chunk in bases (below it per-task overheads dominate)
+TARGET_CHUNK_SECONDS = 1.0
+MIN_CHUNK_SIZE = 1 << 12
+
+# Measured costs in seconds, filled in once per process by calibrate()
+_costs = {}
+_benchmark_symbols = []
+_costs_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+# Fastest of a few runs of a function, in seconds
+def _best_time(function, repeats=3):
+    best = math.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# Task run by the worker processes while timing the pool startup
+def _noop(_):
+    return None
+
+
+# Time the engines on a synthetic sequence and panel
+def calibrate():
+    """
+    Runs the micro-benchmark behind the cost model (once per process, in a fraction of a second).
+    Returns:
+        Dictionary of measured costs in seconds: per base for translating, scanning
+        with the automaton and with the bit-parallel matcher (for a narrow and a wide
+        panel), per base for building a k-mer index and an FM-index, and per marker
+        for an index probe.
+    """
+    with _costs_lock:
+        if "automaton_per_base" in _costs:
+            return dict(_costs)
+        rng = random.Random(0)
+        text = "".join(rng.choice(ALPHABET) for _ in range(BENCHMARK_LENGTH))
+        symbols = text.encode("ascii").translate(SYMBOL_TABLE)
+        markers = [
+            "".join(rng.choice(ALPHABET) for _ in range(BENCHMARK_MARKER_LENGTH)) for _ in range(BENCHMARK_MARKERS)
+        ]
+        automaton = MarkerAutomaton(markers)
+        matcher = ApproximateMatcher(markers, 1)
+        wide_matcher = ApproximateMatcher(
+            ["".join(rng.choice(ALPHABET) for _ in range(BENCHMARK_MARKER_LENGTH)) for _ in range(BENCHMARK_WIDE_MARKERS)],
+            1
+        )
+        wide_symbols = symbols[:BENCHMARK_WIDE_LENGTH]
+        index = KmerIndex.build(text)
+
+        # Building an index is timed once: it takes far longer than a scan of the benchmark
+        _costs["kmer_index_build_per_base"] = _best_time(lambda: KmerIndex.build(text), repeats=1) / BENCHMARK_LENGTH
+        _costs["fm_index_build_per_base"] = _best_time(lambda: FMIndex.build(text), repeats=1) / BENCHMARK_LENGTH
+
+        _costs["translate_per_base"] = _best_time(lambda: list(iter_symbol_chunks(text))) / BENCHMARK_LENGTH
+        _costs["automaton_per_base"] = _best_time(lambda: automaton.scan_presence(symbols)) / BENCHMARK_LENGTH
+        _costs["approximate_per_base"] = _best_time(
+            lambda: matcher.scan(symbols, array("q"), array("q"), array("b"))
+        ) / BENCHMARK_LENGTH
+        _costs["approximate_wide_per_base"] = _best_time(
+            lambda: wide_matcher.scan(wide_symbols, array("q"), array("q"), array("b"))
+        ) / BENCHMARK_WIDE_LENGTH
+        _costs["index_per_marker"] = _best_time(lambda: [index.contains(marker) for marker in markers]) / BENCHMARK_MARKERS
+        _benchmark_symbols[:] = [symbols]
+        return dict(_costs)
+
+
+# Cost per base of searching one marker of a given length with the bytes substring search
+def _substring_cost(length):
+    key = ("substring_per_base", length)
+    with _costs_lock:
+        if key not in _costs:
+            # End the pattern with a symbol the benchmark never contains, so every search reads it all
+            rng = random.Random(length)
+            pattern = bytes(rng.randrange(len(ALPHABET)) for _ in range(length - 1)) + bytes([RESET_SYMBOL])
+            symbols = _benchmark_symbols[0]
+            _costs[key] = _best_time(lambda: pattern in symbols) / BENCHMARK_LENGTH
+        return _costs[key]
+
+
+# Fixed cost of starting a process pool and attaching it to shared memory
+def _parallel_startup(workers):
+    key = ("parallel_startup", workers)
+    with _costs_lock:
+        if key not in _costs:
+            start = time.perf_counter()
+            with worker_pool(workers) as pool:
+                list(pool.map(_noop, range(workers)))
+            _costs[key] = time.perf_counter() - start
+        return _costs[key]
+
+
+# Bases scanned in about TARGET_CHUNK_SECONDS at an estimated cost per base
+def _chunk_size(seconds_per_base):
+    if seconds_per_base <= 0:
+        return PARALLEL_CHUNK_SIZE
+    return int(min(PARALLEL_CHUNK_SIZE, max(MIN_CHUNK_SIZE, TARGET_CHUNK_SECONDS / seconds_per_base)))
+
+
+# Estimate every applicable engine's cost and pick the cheapest
+def choose_engine(sequence_length, marker_lengths, both_strands=False, max_distance=0, has_index=False, workers=1,
+                  index_build=None):
+    """
+    Picks the matching engine with the lowest estimated cost, using costs measured
+    by calibrate(), and logs the choice.
+    Args:
+        sequence_length: Number of bases to search.
+        marker_lengths: Length of every string marker in the panel.
+        both_strands: Markers are also searched on the reverse strand.
+        max_distance: Mismatches tolerated; above 0 only the bit-parallel matcher
+            applies, serially or in parallel.
+        has_index: A KmerIndex or FMIndex over the sequence is available.
+        workers: Number of processes available for the parallel scan.
+        index_build: KMER_INDEX or FM_INDEX if that index still has to be built before
+            the index engine can probe it, which is then added to its estimate; None
+            if the index is already built.
+    Returns:
+        Dictionary with the chosen "engine", the "reason" for it, the "estimates"
+        (seconds) of every engine considered, and the "chunk_size" in bases that
+        engine scans in about TARGET_CHUNK_SECONDS on one core.
+    """
+    costs = calibrate()
+    strands = 2 if both_strands else 1
+    # Every engine first turns the sequence into symbols
+    translate = sequence_length * costs["translate_per_base"]
+
+    estimates = {}
+    if max_distance:
+        # The bit-parallel step count grows with the distance, and each step costs a fixed
+        # overhead plus a share growing with the width of the panel (in benchmark panels)
+        width = strands * sum(marker_lengths) / (BENCHMARK_MARKERS * BENCHMARK_MARKER_LENGTH)
+        per_width = max(0.0, costs["approximate_wide_per_base"] - costs["approximate_per_base"]) / (
+            BENCHMARK_WIDE_MARKERS / BENCHMARK_MARKERS - 1
+        )
+        per_base = costs["approximate_per_base"] + per_width * max(0.0, width - 1)
+        scan = sequence_length * per_base * (max_distance + 1) / 2
+    else:
+        scan = sequence_length * costs["automaton_per_base"]
+        estimates[SUBSTRING_ENGINE] = translate + strands * sequence_length * sum(
+            count * _substring_cost(length) for length, count in Counter(marker_lengths).items()
+        )
+        if has_index:
+            estimates[INDEX_ENGINE] = strands * len(marker_lengths) * costs["index_per_marker"]
+            if index_build is not None:
+                # Building the index first; the FM-index's suffix sorts grow as n log n
+                build = sequence_length * costs[f"{index_build}_index_build_per_base"]
+                if index_build == FM_INDEX:
+                    build *= max(1.0, math.log2(max(sequence_length, 2)) / math.log2(BENCHMARK_LENGTH))
+                estimates[INDEX_ENGINE] += build
+    estimates[AUTOMATON_ENGINE] = translate + scan
+    # Chunks are sized so each one (a worker task when scanning in parallel) takes about
+    # TARGET_CHUNK_SECONDS, however slow the matcher is for this panel
+    chunk_sizes = {engine: _chunk_size(seconds / max(sequence_length, 1)) for engine, seconds in estimates.items()}
+    chunk_sizes[INDEX_ENGINE] = chunk_sizes[PARALLEL_ENGINE] = chunk_sizes[AUTOMATON_ENGINE]
+    chunk_count = max(1, math.ceil(sequence_length / chunk_sizes[AUTOMATON_ENGINE]))
+    if workers > 1 and chunk_count > 1:
+        estimates[PARALLEL_ENGINE] = (
+            _parallel_startup(workers) + translate + scan / min(workers, chunk_count)
+        )
+
+    engine = min(estimates, key=estimates.get)
+    reason = (
+        f"{engine} for {sequence_length:,} bases and {len(marker_lengths)} markers, estimated "
+        + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in sorted(estimates.items(), key=lambda item: item[1]))
+    )
+    logger.info("Chose the %s engine: %s", engine, reason)
+    return {"engine": engine, "reason": reason, "estimates": estimates, "chunk_size": chunk_sizes[engine]}
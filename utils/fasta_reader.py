@@ -0,0 +1,160 @@
+import os
+import string
+from utils.sequence_validation import validate_sequence
+
+
+# Default number of bytes read from the upload at a time
+READ_CHUNK_SIZE = 1 << 20
+
+# Bytes dropped from sequence lines, and the table upper-casing what remains
+_WHITESPACE = b" \t\r\n"
+_UPPERCASE_TABLE = bytes.maketrans(string.ascii_lowercase.encode(), string.ascii_uppercase.encode())
+
+
+# Work out how many bytes a file-like object holds, if it can tell us cheaply
+def _stream_size(fileobj):
+    size = getattr(fileobj, "size", None)
+    if isinstance(size, int):
+        return size
+    try:
+        return os.fstat(fileobj.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+# Record id from a header line: its first word, or a numbered fallback
+def _record_id(header, record_number):
+    words = header.decode("utf-8", errors="replace").split()
+    return words[0] if words else f"record_{record_number}"
+
+
+# Parse a FASTA stream chunk by chunk into header and sequence events
+def _iter_fasta_events(fileobj, chunk_size=READ_CHUNK_SIZE, progress=None):
+    """
+    Parses a FASTA/FNA/plain-text stream without reading it whole.
+    Args:
+        fileobj: Binary file-like object positioned at the start of the data.
+        chunk_size: Number of bytes read at a time.
+        progress: Optional callback receiving (bytes read, total bytes or None) after
+            each chunk; an exception it raises stops the parse.
+    Returns:
+        Generator of ("record", record_id) events, emitted when a record starts, and
+        ("sequence", bytes) events. Sequence segments have line breaks removed, are
+        upper-cased and are validated.
+    Raises:
+        InvalidSequenceError: Pointing at the first invalid base and its record.
+    """
+    in_header = False
+    at_line_start = True
+    header_parts = []
+    record_id = None
+    record_number = 0
+    base_offset = 0
+    total_size = _stream_size(fileobj) if progress is not None else None
+    bytes_read = 0
+
+    while True:
+        data = fileobj.read(chunk_size)
+        if not data:
+            break
+        if progress is not None:
+            bytes_read += len(data)
+            progress(bytes_read, total_size)
+        pos = 0
+        while pos < len(data):
+            if in_header:
+                newline = data.find(b"\n", pos)
+                if newline == -1:
+                    header_parts.append(data[pos:])
+                    break
+                header_parts.append(data[pos:newline])
+                record_number += 1
+                record_id = _record_id(b"".join(header_parts), record_number)
+                base_offset = 0
+                yield "record", record_id
+                header_parts = []
+                in_header = False
+                at_line_start = True
+                pos = newline + 1
+                continue
+
+            if at_line_start and data[pos] == ord(">"):
+                in_header = True
+                pos += 1
+                continue
+
+            # Everything up to the next header line is sequence data
+            next_header = data.find(b"\n>", pos)
+            end = len(data) if next_header == -1 else next_header + 1
+            segment = data[pos:end].translate(_UPPERCASE_TABLE, _WHITESPACE)
+            if segment:
+                if record_id is None:
+                    record_number += 1
+                    record_id = f"record_{record_number}"
+                    yield "record", record_id
+                validate_sequence(segment, base_offset, record_id)
+                base_offset += len(segment)
+                yield "sequence", segment
+            at_line_start = data[end - 1] == ord("\n")
+            pos = end
+
+    if in_header:
+        yield "record", _record_id(b"".join(header_parts), record_number + 1)
+
+
+# Read and validate a whole DNA sequence file into a single buffer
+def read_fasta(fileobj, chunk_size=READ_CHUNK_SIZE, progress=None):
+    """
+    Streams a sequence file into one preallocated buffer, dropping FASTA headers.
+    Args:
+        fileobj: Binary file-like object (e.g. a Streamlit UploadedFile).
+        chunk_size: Number of bytes read at a time.
+        progress: Optional callback receiving (bytes read, total bytes or None) after each chunk.
+    Returns:
+        bytearray holding the upper-cased, validated bases of every record.
+    Raises:
+        InvalidSequenceError: If the file contains anything other than A, T, C and G bases.
+    """
+    # The cleaned sequence can never be longer than the file, so size the buffer once
+    buffer = bytearray(_stream_size(fileobj) or 0)
+    length = 0
+    for kind, data in _iter_fasta_events(fileobj, chunk_size, progress):
+        if kind != "sequence":
+            continue
+        end = length + len(data)
+        if end <= len(buffer):
+            buffer[length:end] = data
+        else:
+            del buffer[length:]
+            buffer += data
+        length = end
+    del buffer[length:]
+    return buffer
+
+
+# Read a multi-FASTA file one record at a time
+def iter_fasta_records(fileobj, chunk_size=READ_CHUNK_SIZE, progress=None):
+    """
+    Lazily yields each record of a FASTA file so records are never joined together.
+    Args:
+        fileobj: Binary file-like object (e.g. a Streamlit UploadedFile).
+        chunk_size: Number of bytes read at a time.
+        progress: Optional callback receiving (bytes read, total bytes or None) after each chunk.
+    Returns:
+        Generator of (record_id, bytearray) tuples. The record id is the first word
+        of the header line; sequence data before any header is yielded as "record_1".
+    Raises:
+        InvalidSequenceError: If a record contains anything other than A, T, C and G bases.
+    """
+    record_id = None
+    sequence = bytearray()
+    for kind, data in _iter_fasta_events(fileobj, chunk_size, progress):
+        if kind == "sequence":
+            sequence += data
+            continue
+        if record_id is not None:
+            yield record_id, sequence
+        record_id = data
+        sequence = bytearray()
+    if record_id is not None:
+        yield record_id, sequence
@@ -0,0 +1,312 @@
+import json
+import os
+import shutil
+
+import numpy as np
+from utils.aho_corasick import ALPHABET, RESET_SYMBOL, is_matchable_pattern, iter_symbol_chunks
+from utils.packed_sequence import sequence_hash
+from utils.store_cleanup import evict_least_recently_used, touch_entry
+
+
+# Default directory for FM-indexes shared between sessions and restarts, and its size
+# limit beyond which the least recently used indexes are removed
+FM_INDEX_DIR = "data/fm_index"
+FM_INDEX_MAX_BYTES = 16 << 30
+
+# BWT symbols: the end-of-text sentinel, A, C, G, T and any other base (e.g. N)
+SENTINEL = 0
+OTHER_SYMBOL = len(ALPHABET) + 1
+NUM_FM_SYMBOLS = len(ALPHABET) + 2
+
+# Rows between occurrence-count checkpoints, and text positions between suffix array samples
+OCC_CHECKPOINT_STEP = 64
+SA_SAMPLE_RATE = 32
+
+_FORMAT_VERSION = 1
+
+
+# Symbols packed into the key of the first sort (3 bits each, so the key fits in an int64)
+INITIAL_PREFIX_LENGTH = 21
+
+# Positions handled at a time when comparing keys, keeping that temporary small
+_COMPARE_BLOCK = 1 << 20
+
+
+# Mark the rows of a sorted key where a new group of equal keys starts
+def _group_starts(keys, order):
+    starts = np.empty(len(order), dtype=bool)
+    starts[:1] = True
+    for block in range(1, len(order), _COMPARE_BLOCK):
+        rows = order[block - 1:block + _COMPARE_BLOCK]
+        sorted_keys = keys[rows]
+        starts[block:block + len(rows) - 1] = sorted_keys[1:] != sorted_keys[:-1]
+    return starts
+
+
+# Rank every row by the first row of its group (mapped through slots, if given, to suffix
+# array rows), and flag the groups of one row
+def _group_ranks(starts, index_type, slots=None):
+    first = np.arange(len(starts), dtype=index_type)
+    first[~starts] = 0
+    np.maximum.accumulate(first, out=first)
+    singleton = starts.copy()
+    singleton[:-1] &= starts[1:]
+    return (first if slots is None else slots[first]), singleton
+
+
+# Build the suffix array of a symbol array by prefix doubling
+def _suffix_array(text, progress=None):
+    """
+    Sorts all suffixes of text (whose last symbol is a unique, smallest sentinel)
+    by prefix doubling, with NumPy sorts instead of Python loops. Suffixes are first
+    sorted by their INITIAL_PREFIX_LENGTH-symbol prefix; each later round only sorts
+    the suffixes still tied with another (Larsson-Sadakane), by the rank of the
+    suffix 'span' positions further on, doubling the span every round. Positions
+    and ranks are int32 below 2**31 bases. The optional progress callback receives
+    (rounds done, most rounds needed) after every round; most sequences finish well
+    before the last one.
+    """
+    length = len(text)
+    index_type = np.int32 if length < 2 ** 31 else np.int64
+    span = INITIAL_PREFIX_LENGTH
+    max_rounds = max(1, (max(length // span, 1) - 1).bit_length() + 1)
+
+    # First round: sort by the prefix packed into one key; the unique sentinel ends
+    # every prefix reaching past the end of the text, so the padding never decides
+    keys = np.zeros(length, dtype=np.int64)
+    for offset in range(span):
+        keys <<= 3
+        keys[:max(length - offset, 0)] |= text[offset:]
+    order = np.argsort(keys)
+    starts = _group_starts(keys, order)
+    del keys
+    order = order.astype(index_type)
+    # Rank of each suffix: the first suffix array row of its group of tied suffixes
+    ranks = np.empty(length, dtype=index_type)
+    group_ranks, singleton = _group_ranks(starts, index_type)
+    del starts
+    ranks[order] = group_ranks
+    del group_ranks
+    unresolved = np.flatnonzero(~singleton).astype(index_type)
+    del singleton
+
+    rounds = 1
+    while len(unresolved):
+        if progress is not None:
+            progress(rounds, max_rounds)
+        # Tied suffixes share their first 'span' symbols, none of which is the sentinel,
+        # so the suffix 'span' positions further on always exists
+        suffixes = order[unresolved]
+        if index_type is np.int32:
+            # Both ranks are below 2**31, so they pack into a single int64 sort key
+            keys = ranks[suffixes].astype(np.int64)
+            keys <<= 32
+            suffixes += span
+            keys |= ranks[suffixes]
+            del suffixes
+            subset_order = np.argsort(keys, kind="stable")
+            starts = _group_starts(keys, subset_order)
+            del keys
+        else:
+            first = ranks[suffixes]
+            second = ranks[suffixes + span]
+            del suffixes
+            subset_order = np.lexsort((second, first))
+            starts = _group_starts(first, subset_order) | _group_starts(second, subset_order)
+            del first, second
+        # The groups being refined fill the unresolved rows, so the sorted subset goes back there
+        suffixes = order[unresolved][subset_order]
+        del subset_order
+        order[unresolved] = suffixes
+        group_ranks, singleton = _group_ranks(starts, index_type, unresolved)
+        ranks[suffixes] = group_ranks
+        unresolved = unresolved[~singleton]
+        del suffixes, starts, group_ranks, singleton
+        span *= 2
+        rounds += 1
+    if progress is not None:
+        progress(max_rounds, max_rounds)
+    return order
+
+
+class FMIndex:
+    """
+    FM-index of a sequence: its Burrows-Wheeler transform with occurrence-count
+    checkpoints and a suffix array sampled every SA_SAMPLE_RATE text positions.
+
+    Counting a marker takes one backward-search step per base, so it costs time
+    proportional to the marker length whatever the sequence size. Locating each
+    occurrence walks back at most SA_SAMPLE_RATE steps to a sampled position.
+    Building peaks at about 20 bytes of memory per base (up to about 35 for highly
+    repetitive sequences, e.g. 5-9 GB for a 250 Mb chromosome), so build once per
+    sequence, save(), and load() the memory-mapped index for every later query.
+    """
+
+    def __init__(self, bwt, checkpoints, symbol_starts, sampled_rows, sampled_positions, sequence_length):
+        self.bwt = bwt
+        self.checkpoints = checkpoints
+        self.symbol_starts = [int(start) for start in symbol_starts]
+        self.sampled_rows = sampled_rows
+        self.sampled_positions = sampled_positions
+        self.sequence_length = sequence_length
+
+    def __len__(self):
+        return self.sequence_length
+
+    @classmethod
+    def build(cls, sequence, progress=None):
+        """
+        Builds the FM-index of a sequence.
+        Args:
+            sequence: DNA sequence as a str, bytes, bytearray or PackedSequence.
+            progress: Optional callback receiving (steps done, total steps) while the
+                suffix array is sorted; an exception it raises stops the build.
+        Returns:
+            FMIndex over the sequence.
+        """
+        # Automaton symbols are A=0..T=3, other=4; shift them up to make room for the sentinel
+        text = np.empty(len(sequence) + 1, dtype=np.uint8)
+        offset = 0
+        for symbols in iter_symbol_chunks(sequence):
+            text[offset:offset + len(symbols)] = np.frombuffer(symbols, dtype=np.uint8) + 1
+            offset += len(symbols)
+        text[-1] = SENTINEL
+        text[text == RESET_SYMBOL + 1] = OTHER_SYMBOL
+
+        suffix_array = _suffix_array(text, progress)
+        bwt = text[suffix_array - 1]
+
+        # Running count of every symbol before each checkpoint row, summed block by block
+        blocks = bwt[:len(bwt) // OCC_CHECKPOINT_STEP * OCC_CHECKPOINT_STEP].reshape(-1, OCC_CHECKPOINT_STEP)
+        checkpoints = np.zeros((len(blocks) + 1, NUM_FM_SYMBOLS), dtype=np.int64)
+        for symbol in range(NUM_FM_SYMBOLS):
+            np.cumsum(np.count_nonzero(blocks == symbol, axis=1), out=checkpoints[1:, symbol])
+
+        totals = np.bincount(text, minlength=NUM_FM_SYMBOLS)
+        symbol_starts = np.concatenate([[0], np.cumsum(totals)[:-1]])
+
+        sampled_rows = np.flatnonzero(suffix_array % SA_SAMPLE_RATE == 0)
+        return cls(bwt, checkpoints, symbol_starts, sampled_rows, suffix_array[sampled_rows], len(sequence))
+
+    def _occurrences(self, symbol, row):
+        # Number of times symbol appears in bwt[:row]
+        checkpoint = row // OCC_CHECKPOINT_STEP
+        start = checkpoint * OCC_CHECKPOINT_STEP
+        return int(self.checkpoints[checkpoint, symbol]) + int(np.count_nonzero(self.bwt[start:row] == symbol))
+
+    def _row_range(self, pattern):
+        # Backward search: the suffix array rows [top, bottom) prefixed by the pattern
+        if not is_matchable_pattern(pattern):
+            return 0, 0
+        top, bottom = 0, len(self.bwt)
+        for base in reversed(pattern):
+            symbol = ALPHABET.index(base) + 1
+            top = self.symbol_starts[symbol] + self._occurrences(symbol, top)
+            bottom = self.symbol_starts[symbol] + self._occurrences(symbol, bottom)
+            if top >= bottom:
+                return 0, 0
+        return top, bottom
+
+    def count(self, pattern):
+        """
+        Returns the number of occurrences of a pattern.
+        """
+        top, bottom = self._row_range(pattern)
+        return bottom - top
+
+    def contains(self, pattern):
+        """
+        Returns True if the pattern occurs anywhere in the indexed sequence.
+        """
+        return self.count(pattern) > 0
+
+    def positions_of(self, pattern):
+        """
+        Returns the sorted start positions of every occurrence of a pattern.
+        """
+        top, bottom = self._row_range(pattern)
+        positions = np.empty(bottom - top, dtype=np.int64)
+        for output, row in enumerate(range(top, bottom)):
+            # Walk back with LF-mapping until reaching a sampled suffix array row
+            steps = 0
+            while True:
+                sample = int(np.searchsorted(self.sampled_rows, row))
+                if sample < len(self.sampled_rows) and self.sampled_rows[sample] == row:
+                    break
+                symbol = int(self.bwt[row])
+                row = self.symbol_starts[symbol] + self._occurrences(symbol, row)
+                steps += 1
+            positions[output] = int(self.sampled_positions[sample]) + steps
+        return np.sort(positions)
+
+    def save(self, directory):
+        """
+        Writes the index as .npy files into a directory, replacing it atomically.
+        """
+        temp_directory = f"{directory}.tmp{os.getpid()}"
+        os.makedirs(temp_directory, exist_ok=True)
+        np.save(os.path.join(temp_directory, "bwt.npy"), self.bwt)
+        np.save(os.path.join(temp_directory, "checkpoints.npy"), self.checkpoints)
+        np.save(os.path.join(temp_directory, "sampled_rows.npy"), self.sampled_rows)
+        np.save(os.path.join(temp_directory, "sampled_positions.npy"), self.sampled_positions)
+        with open(os.path.join(temp_directory, "meta.json"), "w") as handle:
+            json.dump({
+                "version": _FORMAT_VERSION,
+                "sequence_length": self.sequence_length,
+                "symbol_starts": self.symbol_starts,
+                "occ_checkpoint_step": OCC_CHECKPOINT_STEP,
+            }, handle)
+        try:
+            os.replace(temp_directory, directory)
+        except OSError:
+            # Another session saved the same index first
+            if not os.path.isdir(directory):
+                raise
+            shutil.rmtree(temp_directory)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Memory-maps an index written by save(), so sessions share one copy through
+        the OS page cache.
+        """
+        with open(os.path.join(directory, "meta.json")) as handle:
+            meta = json.load(handle)
+        if meta["version"] != _FORMAT_VERSION or meta["occ_checkpoint_step"] != OCC_CHECKPOINT_STEP:
+            raise ValueError(f"{directory} holds an FM-index in an unsupported format.")
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in ("bwt", "checkpoints", "sampled_rows", "sampled_positions")
+        }
+        return cls(
+            arrays["bwt"], arrays["checkpoints"], meta["symbol_starts"], arrays["sampled_rows"],
+            arrays["sampled_positions"], meta["sequence_length"]
+        )
+
+
+# Whether the FM-index of a sequence is already on disk
+def has_stored_fm_index(content_hash, store_dir=FM_INDEX_DIR):
+    return os.path.isdir(os.path.join(store_dir, content_hash))
+
+
+# Build (or reuse) the persisted FM-index of a sequence
+def store_fm_index(sequence, store_dir=FM_INDEX_DIR, max_bytes=FM_INDEX_MAX_BYTES, progress=None):
+    """
+    Builds the FM-index of a sequence unless one is already on disk, and loads it.
+    Storing a new index evicts the least recently used ones beyond max_bytes.
+    Args:
+        sequence: DNA sequence as a str, bytes, bytearray or PackedSequence.
+        store_dir: Directory holding one index directory per sequence content hash.
+        max_bytes: Size limit of the store in bytes.
+        progress: Optional callback passed to FMIndex.build.
+    Returns:
+        Memory-mapped FMIndex.
+    """
+    directory = os.path.join(store_dir, sequence_hash(sequence))
+    if os.path.isdir(directory):
+        touch_entry(directory)
+    else:
+        os.makedirs(store_dir, exist_ok=True)
+        FMIndex.build(sequence, progress).save(directory)
+        evict_least_recently_used(store_dir, max_bytes)
+    return FMIndex.load(directory)
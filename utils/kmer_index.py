@@ -0,0 +1,133 @@
+import numpy as np
+from utils.aho_corasick import ALPHABET, RESET_SYMBOL, is_matchable_pattern, symbols_between
+
+
+# Default k-mer length; up to 15 bases fit uint32 keys
+DEFAULT_KMER_LENGTH = 12
+
+# Number of positions encoded per block while building, keeping temporaries small
+INDEX_BLOCK_SIZE = 1 << 22
+
+
+# 2-bit code of a marker, or None if it holds anything other than A, C, G and T
+def encode_kmer(pattern):
+    if not is_matchable_pattern(pattern):
+        return None
+    code = 0
+    for base in pattern:
+        code = (code << 2) | ALPHABET.index(base)
+    return code
+
+
+class KmerIndex:
+    """
+    Sorted index of the k-mer starting at every position of a sequence, built by
+    rolling a 2-bit encoding over it.
+
+    Each position stores the k bases starting there as a 2k-bit key plus how many
+    of those bases are real (the window is cut short by the end of the sequence or
+    by an N). Keys are sorted, so a marker of length m <= k is a range probe on its
+    code shifted into the top bits, and a longer marker is the intersection of the
+    probes for the k-mers tiling it.
+    """
+
+    def __init__(self, keys, positions, valid_lengths, kmer_length, sequence_length):
+        self.keys = keys
+        self.positions = positions
+        self.valid_lengths = valid_lengths
+        self.kmer_length = kmer_length
+        self.sequence_length = sequence_length
+
+    def __len__(self):
+        return self.sequence_length
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.positions.nbytes + self.valid_lengths.nbytes
+
+    @classmethod
+    def build(cls, sequence, kmer_length=DEFAULT_KMER_LENGTH, progress=None):
+        """
+        Indexes every k-mer of a sequence.
+        Args:
+            sequence: DNA sequence as a str, bytes, bytearray or PackedSequence.
+            kmer_length: Length k of the indexed k-mers (at most 32).
+            progress: Optional callback receiving (bases indexed, sequence length)
+                after every block; an exception it raises stops the build.
+        Returns:
+            KmerIndex over the sequence.
+        """
+        if not 1 <= kmer_length <= 32:
+            raise ValueError("The k-mer length must be between 1 and 32.")
+        length = len(sequence)
+        key_dtype = np.uint32 if kmer_length < 16 else np.uint64
+        keys = np.empty(length, dtype=key_dtype)
+        valid_lengths = np.empty(length, dtype=np.uint8)
+
+        for start in range(0, length, INDEX_BLOCK_SIZE):
+            stop = min(start + INDEX_BLOCK_SIZE, length)
+            # The block plus the k - 1 bases its last windows reach into
+            codes = np.frombuffer(symbols_between(sequence, start, stop + kmer_length - 1), dtype=np.uint8)
+            codes = np.concatenate([codes, np.full(stop + kmer_length - 1 - start - len(codes), RESET_SYMBOL, np.uint8)])
+            invalid = codes == RESET_SYMBOL
+
+            # Roll the 2-bit encoding across the window, one base offset at a time
+            block_keys = np.zeros(stop - start, dtype=key_dtype)
+            for offset in range(kmer_length):
+                block_keys <<= key_dtype(2)
+                block_keys |= (codes[offset:offset + stop - start] & 3).astype(key_dtype)
+            keys[start:stop] = block_keys
+
+            # Bases up to the next N (or the end of the sequence) in each window
+            invalid_positions = np.append(np.flatnonzero(invalid), len(codes))
+            window_starts = np.arange(stop - start)
+            next_invalid = invalid_positions[np.searchsorted(invalid_positions, window_starts)]
+            valid_lengths[start:stop] = np.minimum(next_invalid - window_starts, kmer_length)
+            if progress is not None:
+                progress(stop, length)
+
+        order = np.argsort(keys, kind="stable")
+        position_dtype = np.uint32 if length < 2 ** 32 else np.int64
+        return cls(keys[order], order.astype(position_dtype), valid_lengths[order], kmer_length, length)
+
+    def _prefix_positions(self, code, pattern_length):
+        # Positions whose window starts with the given (at most k-base) code
+        shift = 2 * (self.kmer_length - pattern_length)
+        low = np.searchsorted(self.keys, code << shift, side="left")
+        upper = (code + 1) << shift
+        # An all-T code has no upper key that fits the key width
+        high = len(self.keys) if upper >> (2 * self.kmer_length) else np.searchsorted(self.keys, upper, side="left")
+        rows = slice(low, high)
+        return self.positions[rows][self.valid_lengths[rows] >= pattern_length]
+
+    def positions_of(self, pattern):
+        """
+        Returns the sorted start positions of every occurrence of a pattern.
+        """
+        code = encode_kmer(pattern)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        k = self.kmer_length
+        if len(pattern) <= k:
+            return np.sort(self._prefix_positions(code, len(pattern)).astype(np.int64))
+
+        # Tile the pattern with k-mers (the last one flush with its end) and intersect
+        offsets = list(range(0, len(pattern) - k, k)) + [len(pattern) - k]
+        starts = None
+        for offset in offsets:
+            tile_starts = self._prefix_positions(encode_kmer(pattern[offset:offset + k]), k).astype(np.int64) - offset
+            starts = tile_starts if starts is None else np.intersect1d(starts, tile_starts, assume_unique=True)
+            if not len(starts):
+                break
+        return np.sort(starts)
+
+    def contains(self, pattern):
+        """
+        Returns True if the pattern occurs anywhere in the indexed sequence.
+        """
+        code = encode_kmer(pattern)
+        if code is None:
+            return False
+        if len(pattern) <= self.kmer_length:
+            return bool(len(self._prefix_positions(code, len(pattern))))
+        return bool(len(self.positions_of(pattern)))
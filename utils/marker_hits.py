@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+
+FORWARD_STRAND = 1
+REVERSE_STRAND = -1
+
+
+class MarkerHits:
+    """
+    Columnar table of marker occurrences, one row per hit, backed by NumPy arrays:
+    marker_ids (int32 row in the panel), starts (int64, 0-based forward-strand
+    position of the leftmost base), strands (int8, +1 forward / -1 reverse) and
+    distances (int8 mismatches or edits, 0 for exact hits).
+    """
+
+    def __init__(self, marker_ids, starts, strands, distances=None):
+        self.marker_ids = np.asarray(marker_ids, dtype=np.int32)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.strands = np.asarray(strands, dtype=np.int8)
+        if distances is None:
+            distances = np.zeros(len(self.starts), dtype=np.int8)
+        self.distances = np.asarray(distances, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def nbytes(self):
+        return self.marker_ids.nbytes + self.starts.nbytes + self.strands.nbytes + self.distances.nbytes
+
+    @classmethod
+    def concatenate(cls, parts):
+        """
+        Returns the hits of several tables stacked in order.
+        """
+        return cls(
+            np.concatenate([part.marker_ids for part in parts]),
+            np.concatenate([part.starts for part in parts]),
+            np.concatenate([part.strands for part in parts]),
+            np.concatenate([part.distances for part in parts]),
+        )
+
+    def take(self, rows):
+        """
+        Returns the hits selected by a boolean mask or an array of row indices.
+        """
+        return MarkerHits(self.marker_ids[rows], self.starts[rows], self.strands[rows], self.distances[rows])
+
+    def sorted(self):
+        """
+        Returns the hits ordered by position, then marker id.
+        """
+        return self.take(np.lexsort((self.marker_ids, self.starts)))
+
+    def above_threshold(self, risks, user_threshold):
+        """
+        Returns the hits whose marker risk is at or above the threshold.
+        Args:
+            risks: Associated risk of every panel marker, indexed by marker id.
+            user_threshold: User-provided threshold value for risk analysis.
+        """
+        return self.take(np.asarray(risks, dtype=np.float64)[self.marker_ids] >= user_threshold)
+
+    def counts(self, marker_count):
+        """
+        Returns the number of hits of every panel marker, indexed by marker id.
+        """
+        return np.bincount(self.marker_ids, minlength=marker_count)
+
+    def to_frame(self, panel, limit=None):
+        """
+        Builds a display DataFrame for (at most limit of) the hits, only materializing
+        marker text and descriptions for the rows that are shown. Positions are shown
+        1-based, like the sequence viewer.
+        """
+        hits = self if limit is None else self.take(slice(0, limit))
+        return pd.DataFrame({
+            "Marker": [panel.markers[marker_id] for marker_id in hits.marker_ids.tolist()],
+            "Start": hits.starts + 1,
+            "Strand": np.where(hits.strands == FORWARD_STRAND, "forward", "reverse"),
+            "Distance": hits.distances,
+            "Associated Risk": np.asarray(panel.risks, dtype=np.float64)[hits.marker_ids],
+            "Description": np.asarray(panel.descriptions.take(hits.marker_ids)),
+        })
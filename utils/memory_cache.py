@@ -0,0 +1,79 @@
+import logging
+import threading
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+
+# In-memory size of a cached value: its nbytes (KmerIndex, MarkerHits), or 0 for values
+# without one, e.g. a memory-mapped FMIndex whose pages the OS can reclaim
+def value_size(value):
+    return getattr(value, "nbytes", 0)
+
+
+class MemoryCache:
+    """
+    Process-wide cache of large in-memory results (k-mer indexes, occurrence tables)
+    shared by every session, bounded by their total size in bytes rather than their
+    number: once the values exceed max_bytes, the least recently used ones are
+    dropped. A value larger than max_bytes on its own is returned but not kept.
+
+    Callers asking for a key being computed wait for that computation instead of
+    repeating it. The cache can be shared between threads.
+    """
+
+    def __init__(self, max_bytes, size=value_size):
+        self.max_bytes = max_bytes
+        self._size = size
+        self._entries = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._total
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the value cached for a key, computing and caching it on a miss.
+        Args:
+            key: Hashable key, e.g. a tuple of content hashes and option values.
+            compute: Function returning the value; an exception it raises is
+                propagated and nothing is cached.
+        Returns:
+            The cached or computed value.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][0]
+            try:
+                value = compute()
+                self._put(key, value)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+        return value
+
+    def _put(self, key, value):
+        size = self._size(value)
+        with self._lock:
+            if size > self.max_bytes:
+                logger.info("Not caching %r in memory: %d bytes exceed the %d byte limit", key, size, self.max_bytes)
+                return
+            self._entries[key] = (value, size)
+            self._total += size
+            while self._total > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total -= evicted_size
@@ -1,12 +1,57 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import closing
+
+import numpy as np
 import pandas as pd
+from utils.aho_corasick import MarkerAutomaton, iter_substring_present, reverse_complement
+from utils.approximate_matching import ApproximateMatcher
+from utils.columnar_panel import ARROW_MAGIC, columnar_format, read_columnar_panel
+from utils.engine_selection import INDEX_ENGINE, PARALLEL_ENGINE, SUBSTRING_ENGINE, choose_engine
+from utils.marker_hits import MarkerHits, FORWARD_STRAND, REVERSE_STRAND
+from utils.panel_artifact import load_panel_artifact, save_panel_artifact
+from utils.parallel_scan import (
+    DEFAULT_WORKERS, PARALLEL_CHUNK_SIZE, iter_find_all, iter_find_present, parallel_find_all
+)
+from utils.pwm_motifs import MotifScorer, parse_motif_matrix
+from utils.result_cache import file_content_hash
+from utils.sequence_validation import find_invalid_base
+
+
+MARKERS_FILE = "data/disease_markers.csv"
+
+# Process-wide cache of compiled panels, shared by every Streamlit session:
+# file path -> (mtime_ns, size, content hash, MarkerPanel)
+_panel_cache = {}
+_panel_cache_lock = threading.Lock()
+
+# Background threads hot-reloading panel files: file path -> thread
+_panel_watchers = {}
+
+# Seconds between checks of a watched markers file
+PANEL_WATCH_INTERVAL = 2.0
+
+# Default bases per chunk (per worker task of a parallel scan) between progress reports of
+# detect_markers; select_engine sizes the chunks from the chosen engine's estimated cost
+DETECTION_CHUNK_SIZE = PARALLEL_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
 
 
 # Load disease markers (Ensure this is accurate)
-def load_disease_markers():
+def load_disease_markers(file_path=MARKERS_FILE):
     # Example: You can replace this CSV loading logic with actual paths
-    file_path = "data/disease_markers.csv"
+    # Parquet and Arrow IPC panels (see write_columnar_panel) are recognized by their leading bytes
     try:
-        markers_df = pd.read_csv(file_path)
+        with open(file_path, "rb") as handle:
+            panel_format = columnar_format(handle.read(len(ARROW_MAGIC)))
+        if panel_format:
+            markers_df = read_columnar_panel(file_path, panel_format)
+        else:
+            markers_df = pd.read_csv(file_path)
     except FileNotFoundError:
         # Handle missing CSV case gracefully
         markers_df = pd.DataFrame({
@@ -23,44 +68,650 @@ def load_disease_markers():
     return markers_df
 
 
-# Analyze uploaded DNA sequence
-def analyze_sequence(sequence, user_threshold):
+class MarkerPanel:
     """
-    Analyzes the uploaded sequence for disease markers.
+    Disease marker panel compiled for searching: markers as a plain list, risks
+    as a float64 array, descriptions as a Categorical, plus the automaton matching
+    every marker in one pass. The content hash identifies the panel's source data.
+
+    The automaton holds each marker followed by every marker's reverse complement,
+    so pattern id i is marker i on the forward strand and id len(markers) + i is
+    marker i on the reverse strand, both found in the same scan. Bit-parallel
+    matchers for mismatch-tolerant searches use the same pattern ids and are
+    compiled on first use.
+
+    Rows with a "Motif Matrix" (see parse_motif_matrix) are PWM motifs named by
+    their Marker and found where their score reaches the row's "Score Threshold".
+    They are scored by the MotifScorer and left out of the string matchers.
+    """
+
+    def __init__(self, markers_df, content_hash=None):
+        self.markers = markers_df["Marker"].tolist()
+        risks = markers_df["Associated Risk"].to_numpy()
+        if risks.dtype == np.float32:
+            # Columnar panels store float32 risks; recover the decimals they were written from
+            risks = risks.astype(np.float64).round(6)
+        self.risks = np.asarray(risks, dtype=np.float64)
+        # Dictionary-encoded: one code per marker plus each distinct description once
+        self.descriptions = pd.Categorical(markers_df["Description"])
+
+        motif_ids = []
+        if "Motif Matrix" in markers_df.columns:
+            motif_ids = np.flatnonzero(markers_df["Motif Matrix"].notna().to_numpy()).tolist()
+        matrices, thresholds = [], []
+        for marker_id in motif_ids:
+            threshold = markers_df["Score Threshold"].iloc[marker_id] if "Score Threshold" in markers_df.columns else None
+            if pd.isna(threshold):
+                raise ValueError(f"Motif '{self.markers[marker_id]}' needs a Score Threshold.")
+            matrices.append(parse_motif_matrix(markers_df["Motif Matrix"].iloc[marker_id]))
+            thresholds.append(threshold)
+        self.motifs = MotifScorer(motif_ids, matrices, thresholds)
+
+        # Motif rows keep their pattern ids but never match as strings
+        patterns = list(self.markers)
+        for marker_id in motif_ids:
+            patterns[marker_id] = ""
+        self.automaton = MarkerAutomaton(patterns + [reverse_complement(pattern) for pattern in patterns])
+        if content_hash is None:
+            content_hash = hashlib.sha256(markers_df.to_csv(index=False).encode()).hexdigest()
+        self.content_hash = content_hash
+        self._approximate_matchers = {}
+
+    def marker_length(self, marker_id):
+        """
+        Returns the number of bases an exact hit of the marker spans (its matrix
+        length for PWM motifs).
+        """
+        if marker_id in self.motifs.motif_ids:
+            return len(self.motifs.forward[self.motifs.motif_ids.index(marker_id)])
+        return len(self.markers[marker_id])
+
+    def approximate_matcher(self, max_distance, edit_distance=False):
+        """
+        Returns the (cached) bit-parallel matcher allowing up to max_distance
+        mismatches, or edits when edit_distance is True.
+        """
+        key = (max_distance, edit_distance)
+        if key not in self._approximate_matchers:
+            self._approximate_matchers[key] = ApproximateMatcher(self.automaton.patterns, max_distance, edit_distance)
+        return self._approximate_matchers[key]
+
+
+# Compile a panel from its source, or load the artifact compiled from the same content
+def _compile_panel(file_path, content_hash, file_state):
+    panel = load_panel_artifact(content_hash)
+    if panel is not None:
+        return panel
+    # Columnar panels are memory-mapped and CSV panels parsed from the file, so the
+    # source is never held in memory as a whole
+    with open(file_path, "rb") as handle:
+        panel_format = columnar_format(handle.read(len(ARROW_MAGIC)))
+    if panel_format:
+        markers_df = read_columnar_panel(file_path, panel_format)
+    else:
+        markers_df = pd.read_csv(file_path)
+    panel = MarkerPanel(markers_df, content_hash)
+    # A file rewritten while it was read may not match its hash; it is not saved, and
+    # the next refresh sees the new mtime and compiles it again
+    stat = os.stat(file_path)
+    if (stat.st_mtime_ns, stat.st_size) != file_state:
+        logger.warning("%s changed while it was compiled; not saving its panel", file_path)
+        return panel
+    try:
+        save_panel_artifact(panel)
+    except OSError:
+        # A read-only data directory only costs recompiling after a restart
+        logger.warning("Could not save the compiled panel for %s", file_path)
+    return panel
+
+
+# Bring the cached panel for a file up to date; the caller holds _panel_cache_lock
+def _refresh_panel(file_path):
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        stat = None
+    file_state = (stat.st_mtime_ns, stat.st_size) if stat else (None, None)
+    cached = _panel_cache.get(file_path)
+    if cached and cached[:2] == file_state:
+        return cached[3]
+
+    if stat is None:
+        panel = MarkerPanel(load_disease_markers(file_path))
+        _panel_cache[file_path] = (*file_state, panel.content_hash, panel)
+        return panel
+
+    # The file was touched: only recompile if its content actually changed, hashing it
+    # in chunks so a large panel is never read into memory at once
+    with open(file_path, "rb") as handle:
+        content_hash = file_content_hash(handle)
+    if cached and cached[2] == content_hash:
+        panel = cached[3]
+    else:
+        panel = _compile_panel(file_path, content_hash, file_state)
+    # Readers see either the old or the new entry, never a half-built panel
+    _panel_cache[file_path] = (*file_state, content_hash, panel)
+    return panel
+
+
+# Load the compiled marker panel, reusing the process-wide cache
+def load_marker_panel(file_path=MARKERS_FILE):
+    """
+    Returns the compiled MarkerPanel for a markers file, parsing and compiling it only
+    when the file is new to this process or has changed, and reusing the artifact
+    compiled by an earlier process from the same content.
     Args:
-        sequence: Uploaded sequence data as a string.
-        user_threshold: User-provided threshold value for risk analysis.
+        file_path: Path to the markers CSV, Parquet or Arrow file.
     Returns:
-        markers_detected: List of detected markers and their risks.
-        risk_summary: Dictionary summarizing analysis.
+        MarkerPanel shared by every caller until the file's mtime and content hash change.
+    """
+    # A watched file is kept up to date in the background, so never compile here
+    if file_path in _panel_watchers:
+        cached = _panel_cache.get(file_path)
+        if cached:
+            return cached[3]
+    with _panel_cache_lock:
+        return _refresh_panel(file_path)
+
+
+# Compile a markers file into its panel artifact
+def compile_marker_panel(file_path=MARKERS_FILE):
+    """
+    Compiles a markers file (or loads its up-to-date artifact) ahead of the first analysis.
+    Args:
+        file_path: Path to the markers CSV, Parquet or Arrow file.
+    Returns:
+        The compiled MarkerPanel, also saved under PANEL_ARTIFACT_DIR.
+    """
+    return load_marker_panel(file_path)
+
+
+# Poll a markers file and swap in its recompiled panel when it changes
+def _watch_panel(file_path, interval):
+    failed_state = None
+    while True:
+        time.sleep(interval)
+        try:
+            stat = os.stat(file_path)
+            file_state = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            file_state = None
+        # Do not retry (and log again) a broken file until it is written again
+        if failed_state is not None and file_state == failed_state:
+            continue
+        try:
+            with _panel_cache_lock:
+                _refresh_panel(file_path)
+            failed_state = None
+        except Exception:
+            # Keep serving the last good panel, e.g. while the file is half written
+            failed_state = file_state
+            logger.exception("Could not reload the marker panel from %s", file_path)
+
+
+# Hot-reload a markers file without restarting the server
+def watch_marker_panel(file_path=MARKERS_FILE, interval=PANEL_WATCH_INTERVAL):
+    """
+    Compiles the panel now and starts a background thread (once per process and file)
+    that recompiles it whenever the file changes and swaps it into the shared cache.
+    Sessions keep getting the previous panel from load_marker_panel until the new
+    one is ready.
+    Args:
+        file_path: Path to the markers CSV, Parquet or Arrow file.
+        interval: Seconds between checks of the file's mtime and size.
+    Returns:
+        The watcher thread.
     """
-    markers_df = load_disease_markers()
+    with _panel_cache_lock:
+        watcher = _panel_watchers.get(file_path)
+        if watcher is None or not watcher.is_alive():
+            _refresh_panel(file_path)
+            watcher = threading.Thread(
+                target=_watch_panel, args=(file_path, interval), name=f"panel-watcher:{file_path}", daemon=True
+            )
+            watcher.start()
+            _panel_watchers[file_path] = watcher
+    return watcher
+
+
+# Detect every marker with the chosen engine, yielding the strands (and closest distance)
+# of the markers found so far, by marker id, after each chunk
+def _iter_marker_strands(sequence, panel, both_strands, max_distance, edit_distance, index, workers, substring,
+                         chunk_size=DETECTION_CHUNK_SIZE):
+    # Work is counted in bases scanned: the sequence once, plus once more for PWM motifs,
+    # which are scored in a second pass whichever way the string markers were matched
+    marker_count = len(panel.markers)
+    length = len(sequence)
+    total = length * (2 if len(panel.motifs) else 1)
+    strands = {}
+    distances = {}
+    if max_distance:
+        # Closest occurrence of every (marker, strand) pair among the approximate hits
+        matcher = panel.approximate_matcher(max_distance, edit_distance)
+        no_hit = np.iinfo(np.int8).max
+        closest = np.full(2 * marker_count, no_hit, dtype=np.int8)
+        # Once every pair asked for was seen at distance 0, later chunks cannot change the result
+        wanted_keys = [
+            2 * (pattern_id % marker_count) + (pattern_id >= marker_count)
+            for pattern_id in panel.automaton.matchable_ids if both_strands or pattern_id < marker_count
+        ]
+        if not wanted_keys or not length:
+            yield length, total, strands, distances
+        else:
+            with closing(iter_find_all(matcher, sequence, workers, chunk_size, panel.content_hash)) as steps:
+                for scanned, _, (hit_ids, _, hit_distances) in steps:
+                    pattern_ids = np.frombuffer(hit_ids, dtype=np.int64)
+                    hit_distances = np.frombuffer(hit_distances, dtype=np.int8)
+                    if not both_strands:
+                        forward = pattern_ids < marker_count
+                        pattern_ids, hit_distances = pattern_ids[forward], hit_distances[forward]
+                    keys = 2 * (pattern_ids % marker_count) + (pattern_ids >= marker_count)
+                    np.minimum.at(closest, keys, hit_distances)
+                    strands, distances = {}, {}
+                    for key in np.flatnonzero(closest != no_hit).tolist():
+                        marker_id, reverse = divmod(key, 2)
+                        strands.setdefault(marker_id, set()).add("reverse" if reverse else "forward")
+                        distances[marker_id] = min(distances.get(marker_id, no_hit), int(closest[key]))
+                    complete = not closest[wanted_keys].any()
+                    yield (length if complete else scanned), total, strands, distances
+                    if complete:
+                        break
+    elif index is not None:
+        # Probe the index once per marker (and reverse complement)
+        patterns = panel.automaton.patterns
+        for pattern_id in range(2 * marker_count if both_strands else marker_count):
+            if index.contains(patterns[pattern_id]):
+                strand = "forward" if pattern_id < marker_count else "reverse"
+                strands.setdefault(pattern_id % marker_count, set()).add(strand)
+        yield length, total, strands, distances
+    else:
+        # Search for every known marker on both strands in a single pass over the sequence,
+        # stopping as soon as every marker (on every strand asked for) has been seen
+        wanted = range(2 * marker_count if both_strands else marker_count)
+        if substring:
+            steps = iter_substring_present(panel.automaton.patterns, sequence, wanted, chunk_size)
+        else:
+            steps = iter_find_present(panel.automaton, sequence, workers, chunk_size, wanted, panel.content_hash)
+        with closing(steps):
+            for scanned, present in steps:
+                strands = {}
+                for pattern_id in present:
+                    if pattern_id < marker_count:
+                        strands.setdefault(pattern_id, set()).add("forward")
+                    elif both_strands:
+                        strands.setdefault(pattern_id - marker_count, set()).add("reverse")
+                yield scanned, total, strands, distances
+
+    if len(panel.motifs):
+        # Motif windows count as exact hits (distance 0) in every mode
+        for scored, found in panel.motifs.iter_present(sequence, both_strands):
+            for marker_id, strand in found:
+                strands.setdefault(marker_id, set()).add("forward" if strand == FORWARD_STRAND else "reverse")
+                if max_distance:
+                    distances[marker_id] = 0
+            yield length + scored, total, strands, distances
+
+
+# Turn the strands and distances of detected markers into detect_markers results
+def _marker_detections(panel, strands, distances, both_strands, max_distance):
     markers_detected = []
-    total_risk_score = 0
+    for index in sorted(strands):
+        marker = {
+            "Marker": panel.markers[index],
+            "Associated Risk": float(panel.risks[index]),
+            "Description": panel.descriptions[index]
+        }
+        if both_strands:
+            marker["Strand"] = next(iter(strands[index])) if len(strands[index]) == 1 else "both"
+        if max_distance:
+            marker["Distance"] = distances[index]
+        markers_detected.append(marker)
+    return markers_detected
 
-    # Validate sequence to ensure only A, T, C, and G are used
-    valid_sequence = all(base in "ATCG" for base in sequence)
 
-    if not valid_sequence:
+# Detect every panel marker in a sequence, independent of any threshold
+def detect_markers(sequence, panel=None, validated=False, both_strands=False, max_distance=0, edit_distance=False,
+                   index=None, workers=1, substring=False, progress=None, chunk_size=DETECTION_CHUNK_SIZE):
+    """
+    Scans the sequence once for every marker in the panel, only recording which markers
+    are present, and stops as soon as all of them have been seen. The result does not
+    depend on the risk threshold, so it can be cached per sequence and panel and
+    filtered with filter_markers as often as needed.
+    Args:
+        sequence: Uploaded sequence data as a string, bytes or PackedSequence.
+        panel: Compiled MarkerPanel to search with (the cached panel from the markers CSV if omitted).
+        validated: True if the sequence was already validated (e.g. by read_fasta),
+            which skips the validation pass.
+        both_strands: Also report markers found on the reverse strand. Each detected
+            marker then carries a "Strand" of "forward", "reverse" or "both".
+        max_distance: Number of mismatches tolerated per marker. Above 0, each detected
+            marker carries the "Distance" of its closest occurrence.
+        edit_distance: Count insertions and deletions as well as mismatches.
+        index: KmerIndex or FMIndex built over the sequence; exact searches then probe
+            the index for each marker instead of scanning the sequence.
+        workers: Number of processes scanning overlapping chunks of a large sequence
+            in parallel; the result is the same as a serial scan.
+        substring: Search each marker with the bytes substring search instead of the
+            automaton, which is faster for a handful of markers.
+        progress: Optional callback receiving (bases scanned, total) after every chunk
+            (as each worker task completes in a parallel scan). The total is the
+            sequence length, doubled for panels with PWM motifs, which are scored in
+            a second pass. An exception it raises stops the scan within one chunk.
+        chunk_size: Bases per chunk, i.e. per worker task of a parallel scan.
+    Returns:
+        List of every detected marker and its risk, in panel order.
+    """
+    if panel is None:
+        panel = load_marker_panel()
+
+    # Validate sequence to ensure only A, T, C, and G are used
+    if not validated and find_invalid_base(sequence) != -1:
         # Handle invalid sequence
-        return [], {"Detected Markers": 0, "Total Risk Score": 0}
-
-    # Search for known markers in sequence
-    for index, row in markers_df.iterrows():
-        if row["Marker"] in sequence:
-            markers_detected.append({
-                "Marker": row["Marker"],
-                "Associated Risk": row["Associated Risk"],
-                "Description": row["Description"]
-            })
-            total_risk_score += row["Associated Risk"]
-
-    # Apply the user-defined threshold
+        return []
+
+    strands, distances = {}, {}
+    with closing(_iter_marker_strands(
+        sequence, panel, both_strands, max_distance, edit_distance, index, workers, substring, chunk_size
+    )) as steps:
+        for done, total, strands, distances in steps:
+            if progress is not None:
+                progress(done, total)
+    return _marker_detections(panel, strands, distances, both_strands, max_distance)
+
+
+# Detect markers chunk by chunk, yielding what was found so far after each chunk
+def stream_markers(sequence, panel=None, validated=False, both_strands=False, max_distance=0, edit_distance=False,
+                   index=None, workers=1, substring=False, chunk_size=DETECTION_CHUNK_SIZE):
+    """
+    Streaming counterpart of detect_markers: runs the same single scan and yields an
+    update after every chunk of chunk_size bases (as each worker task completes in
+    a parallel scan), so the first detections can be shown long before a large
+    sequence is fully scanned. Like detect_markers, it stops once every marker has
+    been seen. The arguments are those of detect_markers.
+
+    Only the scan is streamed: the sequence must already be in memory or in the
+    store, so for an upload the first update still comes after the whole file was
+    read, validated and packed.
+    Returns:
+        Generator of dictionaries, one per chunk, with the "bases_scanned" so far out
+        of "total_bases" (the progress of detect_markers: parallel chunks complete
+        in any order and PWM motifs take a second pass), the "new_markers" first
+        detected in this chunk, every marker detected so far as "markers_detected"
+        (in panel order, like detect_markers) and the running "total_risk" of those
+        markers. The last update holds the detect_markers result.
+    """
+    if panel is None:
+        panel = load_marker_panel()
+    length = len(sequence)
+
+    if not validated and find_invalid_base(sequence) != -1:
+        # Like detect_markers, an invalid sequence has no markers
+        yield {
+            "bases_scanned": length, "total_bases": length, "new_markers": [], "markers_detected": [], "total_risk": 0
+        }
+        return
+
+    reported = set()
+    with closing(_iter_marker_strands(
+        sequence, panel, both_strands, max_distance, edit_distance, index, workers, substring, chunk_size
+    )) as steps:
+        for bases_scanned, total_bases, strands, distances in steps:
+            markers_detected = _marker_detections(panel, strands, distances, both_strands, max_distance)
+            new_markers = [
+                marker for marker_id, marker in zip(sorted(strands), markers_detected) if marker_id not in reported
+            ]
+            reported.update(strands)
+            yield {
+                "bases_scanned": bases_scanned,
+                "total_bases": total_bases,
+                "new_markers": new_markers,
+                "markers_detected": markers_detected,
+                "total_risk": sum(marker["Associated Risk"] for marker in markers_detected),
+            }
+
+
+# Report every marker occurrence with its position and strand
+def locate_markers(sequence, panel=None, validated=False, both_strands=False, max_distance=0, edit_distance=False,
+                   index=None, workers=1, progress=None, chunk_size=DETECTION_CHUNK_SIZE):
+    """
+    Scans the sequence once and returns every occurrence of every panel marker as a
+    columnar MarkerHits table instead of one dict per marker.
+    Args:
+        sequence: Uploaded sequence data as a string, bytes or PackedSequence.
+        panel: Compiled MarkerPanel to search with (the cached panel from the markers CSV if omitted).
+        validated: True if the sequence was already validated (e.g. by read_fasta),
+            which skips the validation pass.
+        both_strands: Also report occurrences on the reverse strand.
+        max_distance: Number of mismatches tolerated per occurrence, found with a
+            bit-parallel scan over the whole panel.
+        edit_distance: Count insertions and deletions as well as mismatches. Starts
+            are then estimated as the end position minus the marker length.
+        index: KmerIndex or FMIndex built over the sequence; exact searches then probe
+            the index for each marker instead of scanning the sequence.
+        workers: Number of processes scanning overlapping chunks of a large sequence
+            in parallel; the result is the same as a serial scan.
+        progress: Optional callback receiving (bases scanned, total bases) after every
+            chunk, as for detect_markers; an exception it raises stops the scan.
+        chunk_size: Bases per chunk, i.e. per worker task of a parallel scan.
+    Returns:
+        MarkerHits (empty for an invalid sequence); use sorted() for position order.
+    """
+    if panel is None:
+        panel = load_marker_panel()
+
+    if not validated and find_invalid_base(sequence) != -1:
+        return MarkerHits([], [], [])
+
+    marker_count = len(panel.markers)
+    lengths = np.asarray(panel.automaton.pattern_lengths, dtype=np.int64)
+    # Motif panels take a second pass over the sequence, counted in the total
+    total = len(sequence) * (2 if len(panel.motifs) else 1)
+    scan_progress = None if progress is None else lambda scanned, _: progress(scanned, total)
+
+    # Collect raw (pattern id, end) columns in compact typed arrays during the scan
+    if max_distance:
+        matcher = panel.approximate_matcher(max_distance, edit_distance)
+        hit_ids, hit_ends, hit_distances = parallel_find_all(
+            matcher, sequence, workers, chunk_size, panel.content_hash, scan_progress
+        )
+        distances = np.frombuffer(hit_distances, dtype=np.int8)
+    elif index is not None:
+        # Probe the index once per marker (and reverse complement)
+        pattern_count = 2 * marker_count if both_strands else marker_count
+        pattern_starts = [index.positions_of(pattern) for pattern in panel.automaton.patterns[:pattern_count]]
+        hit_ids = np.repeat(np.arange(pattern_count, dtype=np.int64), [len(starts) for starts in pattern_starts])
+        hit_ends = np.concatenate(pattern_starts + [np.empty(0, np.int64)]) + lengths[hit_ids]
+        distances = np.zeros(len(hit_ids), dtype=np.int8)
+        if scan_progress is not None:
+            scan_progress(len(sequence), total)
+    else:
+        hit_ids, hit_ends = parallel_find_all(
+            panel.automaton, sequence, workers, chunk_size, panel.content_hash, scan_progress
+        )
+        distances = np.zeros(len(hit_ids), dtype=np.int8)
+
+    pattern_ids = np.frombuffer(hit_ids, dtype=np.int64)
+    ends = np.frombuffer(hit_ends, dtype=np.int64)
+    if not both_strands:
+        forward = pattern_ids < marker_count
+        pattern_ids, ends, distances = pattern_ids[forward], ends[forward], distances[forward]
+    hits = MarkerHits(
+        pattern_ids % max(marker_count, 1),
+        np.maximum(ends - lengths[pattern_ids], 0),
+        np.where(pattern_ids < marker_count, FORWARD_STRAND, REVERSE_STRAND),
+        distances,
+    )
+    if len(panel.motifs):
+        # Motif windows count as exact hits (distance 0) in every mode
+        hits = MarkerHits.concatenate([hits, panel.motifs.locate(sequence, both_strands)])
+        if progress is not None:
+            progress(total, total)
+    return hits
+
+
+# Apply the risk threshold to detected markers
+def filter_markers(markers_detected, user_threshold):
+    """
+    Filters detect_markers output by the user threshold without touching the sequence.
+    Args:
+        markers_detected: List of detected markers from detect_markers.
+        user_threshold: User-provided threshold value for risk analysis.
+    Returns:
+        markers_detected: List of detected markers at or above the threshold.
+        risk_summary: Dictionary summarizing analysis.
+    """
     filtered_markers = [marker for marker in markers_detected if marker["Associated Risk"] >= user_threshold]
 
     risk_summary = {
         "Detected Markers": len(filtered_markers),
-        "Total Risk Score": total_risk_score
+        "Total Risk Score": sum(marker["Associated Risk"] for marker in markers_detected)
     }
 
     return filtered_markers, risk_summary
+
+
+# Analyze uploaded DNA sequence
+def analyze_sequence(sequence, user_threshold, panel=None, validated=False, both_strands=False, max_distance=0,
+                     edit_distance=False, index=None, workers=1, progress=None):
+    """
+    Analyzes the uploaded sequence for disease markers.
+    Args:
+        sequence: Uploaded sequence data as a string, bytes or PackedSequence.
+        user_threshold: User-provided threshold value for risk analysis.
+        panel: Compiled MarkerPanel to search with (the cached panel from the markers CSV if omitted).
+        validated: True if the sequence was already validated (e.g. by read_fasta),
+            which skips the validation pass.
+        both_strands: Also report markers found on the reverse strand.
+        max_distance: Number of mismatches tolerated per marker.
+        edit_distance: Count insertions and deletions as well as mismatches.
+        index: KmerIndex or FMIndex built once over the sequence (e.g. by store_fm_index)
+            and reused across analyses; exact searches then skip scanning the sequence.
+        workers: Number of processes scanning chunks of a large sequence in parallel.
+        progress: Optional callback receiving (bases scanned, sequence length) as the
+            scan advances, e.g. AnalysisJob.report.
+    Returns:
+        markers_detected: List of detected markers and their risks.
+        risk_summary: Dictionary summarizing analysis.
+    """
+    markers_detected = detect_markers(sequence, panel, validated, both_strands, max_distance, edit_distance, index,
+                                      workers, progress=progress)
+    return filter_markers(markers_detected, user_threshold)
+
+
+# Pick the matching engine for a sequence, a panel and the resources at hand
+def select_engine(sequence, panel=None, both_strands=False, max_distance=0, index=None, workers=1, index_build=None):
+    """
+    Chooses how detect_markers should search, from the sequence length, the panel
+    size and marker lengths and the available index and cores, with a cost model
+    calibrated by a micro-benchmark (see choose_engine). The choice is logged.
+    Args:
+        sequence: Sequence to be searched.
+        panel: Compiled MarkerPanel (the cached panel from the markers CSV if omitted).
+        both_strands: Markers will also be searched on the reverse strand.
+        max_distance: Number of mismatches tolerated per marker.
+        index: KmerIndex or FMIndex over the sequence, if one is available, or True
+            if one can be built; the index option is then True and is replaced by
+            the built index only when the index engine is chosen.
+        workers: Number of processes available for a parallel scan.
+        index_build: KMER_INDEX or FM_INDEX if index is True and that index is not
+            built yet, so the cost model counts building it.
+    Returns:
+        Dictionary with the "engine", the "reason" for the choice and the "options"
+        (index, workers, substring, chunk_size) to pass to detect_markers or
+        stream_markers.
+    """
+    if panel is None:
+        panel = load_marker_panel()
+    marker_count = len(panel.markers)
+    lengths = panel.automaton.pattern_lengths
+    marker_lengths = [lengths[marker_id] for marker_id in sorted(panel.automaton.matchable_ids) if marker_id < marker_count]
+    choice = choose_engine(
+        len(sequence), marker_lengths, both_strands, max_distance, index is not None, workers, index_build
+    )
+    choice["options"] = {
+        "index": index if choice["engine"] == INDEX_ENGINE else None,
+        "workers": workers if choice["engine"] == PARALLEL_ENGINE else 1,
+        "substring": choice["engine"] == SUBSTRING_ENGINE,
+        "chunk_size": choice["chunk_size"],
+    }
+    return choice
+
+
+# Analyze a sequence with the engine the cost model expects to be fastest
+def analyze_sequence_auto(sequence, user_threshold, panel=None, validated=False, both_strands=False, max_distance=0,
+                          edit_distance=False, index=None, workers=DEFAULT_WORKERS, progress=None):
+    """
+    Dispatches analyze_sequence to the engine picked by select_engine.
+    Args:
+        sequence: Uploaded sequence data as a string, bytes or PackedSequence.
+        user_threshold: User-provided threshold value for risk analysis.
+        panel: Compiled MarkerPanel (the cached panel from the markers CSV if omitted).
+        validated: True if the sequence was already validated.
+        both_strands: Also report markers found on the reverse strand.
+        max_distance: Number of mismatches tolerated per marker.
+        edit_distance: Count insertions and deletions as well as mismatches.
+        index: KmerIndex or FMIndex over the sequence, used if it is the cheapest engine.
+        workers: Number of processes available for a parallel scan.
+        progress: Optional callback receiving (bases scanned, sequence length).
+    Returns:
+        markers_detected: List of detected markers and their risks.
+        risk_summary: Dictionary summarizing analysis.
+    """
+    if panel is None:
+        panel = load_marker_panel()
+    choice = select_engine(sequence, panel, both_strands, max_distance, index, workers)
+    markers_detected = detect_markers(
+        sequence, panel, validated, both_strands, max_distance, edit_distance, **choice["options"], progress=progress
+    )
+    return filter_markers(markers_detected, user_threshold)
+
+
+# Detect markers in every record of a multi-FASTA file separately
+def detect_records(records, panel=None, validated=False, both_strands=False, max_distance=0, edit_distance=False):
+    """
+    Detects markers in each record on its own so markers never span record boundaries.
+    Args:
+        records: Iterable of (record_id, sequence) tuples, e.g. from iter_fasta_records.
+        panel: Compiled MarkerPanel to search with (the cached panel from the markers CSV if omitted).
+        validated: True if the records were already validated while being read.
+        both_strands: Also report markers found on the reverse strand.
+        max_distance: Number of mismatches tolerated per marker.
+        edit_distance: Count insertions and deletions as well as mismatches.
+    Returns:
+        Dictionary mapping record id to its detect_markers result.
+    """
+    if panel is None:
+        panel = load_marker_panel()
+    results = {}
+    for record_id, sequence in records:
+        # Keep repeated record ids apart instead of overwriting earlier results
+        key = record_id
+        duplicate = 1
+        while key in results:
+            duplicate += 1
+            key = f"{record_id}_{duplicate}"
+        results[key] = detect_markers(sequence, panel, validated, both_strands, max_distance, edit_distance)
+    return results
+
+
+# Analyze every record of a multi-FASTA file separately
+def analyze_records(records, user_threshold, validated=False, both_strands=False, max_distance=0, edit_distance=False):
+    """
+    Analyzes each record on its own so markers never span record boundaries.
+    Args:
+        records: Iterable of (record_id, sequence) tuples, e.g. from iter_fasta_records.
+        user_threshold: User-provided threshold value for risk analysis.
+        validated: True if the records were already validated while being read.
+        both_strands: Also report markers found on the reverse strand.
+        max_distance: Number of mismatches tolerated per marker.
+        edit_distance: Count insertions and deletions as well as mismatches.
+    Returns:
+        Dictionary mapping record id to its (markers_detected, risk_summary) tuple.
+    """
+    return {
+        record_id: filter_markers(markers_detected, user_threshold)
+        for record_id, markers_detected in detect_records(
+            records, validated=validated, both_strands=both_strands, max_distance=max_distance,
+            edit_distance=edit_distance
+        ).items()
+    }
@@ -0,0 +1,267 @@
+import hashlib
+import os
+import struct
+
+import numpy as np
+from utils.aho_corasick import ALPHABET, RESET_SYMBOL
+from utils.store_cleanup import evict_least_recently_used, touch_entry
+
+
+# On-disk layout: magic, base count and run count, then the ambiguity run table
+# (starts, ends, bytes) followed by the packed bases, 4 per byte
+_MAGIC = b"DNA2BIT\x01"
+_HEADER = struct.Struct("<8sQQ")
+
+# Default directory for packed sequences shared between sessions, and its size limit
+# beyond which the least recently used ones are removed
+SEQUENCE_STORE_DIR = "data/sequence_store"
+SEQUENCE_STORE_MAX_BYTES = 4 << 30
+
+# Number of bases packed or unpacked per block, keeping temporaries small
+PACK_BLOCK_SIZE = 1 << 22
+
+# Byte -> 2-bit code for A/C/G/T (same order as the automaton alphabet); 4 marks anything else
+_CODE_TABLE = np.full(256, RESET_SYMBOL, dtype=np.uint8)
+_CODE_TABLE[np.frombuffer(ALPHABET.encode(), dtype=np.uint8)] = np.arange(len(ALPHABET), dtype=np.uint8)
+_BASE_TABLE = np.frombuffer(ALPHABET.encode(), dtype=np.uint8)
+_SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8)
+
+
+# Find runs of identical non-ACGT bytes in a block
+def _ambiguous_runs(block, codes, offset):
+    ambiguous = codes == RESET_SYMBOL
+    if not ambiguous.any():
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.uint8)
+    same_as_next = ambiguous[:-1] & ambiguous[1:] & (block[:-1] == block[1:])
+    run_start = ambiguous.copy()
+    run_start[1:] &= ~same_as_next
+    run_end = ambiguous.copy()
+    run_end[:-1] &= ~same_as_next
+    starts = np.flatnonzero(run_start)
+    ends = np.flatnonzero(run_end) + 1
+    return starts + offset, ends + offset, block[starts]
+
+
+class PackedSequence:
+    """
+    DNA sequence stored with 2 bits per base plus a side table of runs of
+    N/ambiguity characters, optionally memory-mapped from a file on disk.
+    """
+
+    def __init__(self, packed, length, run_starts, run_ends, run_bytes, path=None, content_hash=None):
+        self.packed = packed
+        self.length = length
+        self.run_starts = run_starts
+        self.run_ends = run_ends
+        self.run_bytes = run_bytes
+        self.path = path
+        self.content_hash = content_hash
+
+    def __len__(self):
+        return self.length
+
+    def __reduce__(self):
+        # Sequences memory-mapped from the store pickle as their path, so caches that
+        # pickle values (st.cache_data, the result cache) map the file again instead of
+        # copying the bases
+        if self.path is not None:
+            return _reopen, (self.path, self.content_hash)
+        return super().__reduce__()
+
+    @classmethod
+    def from_bytes(cls, sequence):
+        """
+        Packs an ASCII sequence (str, bytes or bytearray). Bases other than A, C, G
+        and T are kept in the run table and restored by unpack().
+        """
+        if isinstance(sequence, str):
+            sequence = sequence.encode("ascii", errors="replace")
+        data = np.frombuffer(sequence, dtype=np.uint8)
+        packed = np.zeros((len(data) + 3) // 4, dtype=np.uint8)
+        starts, ends, run_bytes = [], [], []
+        for start in range(0, len(data), PACK_BLOCK_SIZE):
+            block = data[start:start + PACK_BLOCK_SIZE]
+            codes = _CODE_TABLE[block]
+            block_starts, block_ends, block_bytes = _ambiguous_runs(block, codes, start)
+            # Continue a run that crosses the block boundary instead of splitting it
+            if len(block_starts) and ends and ends[-1][-1] == block_starts[0] and run_bytes[-1][-1] == block_bytes[0]:
+                ends[-1][-1] = block_ends[0]
+                block_starts, block_ends, block_bytes = block_starts[1:], block_ends[1:], block_bytes[1:]
+            if len(block_starts):
+                starts.append(block_starts)
+                ends.append(block_ends)
+                run_bytes.append(block_bytes)
+            codes[codes == RESET_SYMBOL] = 0
+            quads = np.zeros((len(codes) + 3) // 4 * 4, dtype=np.uint8)
+            quads[:len(codes)] = codes
+            quads = quads.reshape(-1, 4) << _SHIFTS
+            packed[start // 4:start // 4 + len(quads)] = np.bitwise_or.reduce(quads, axis=1)
+        return cls(
+            packed,
+            len(data),
+            np.concatenate(starts) if starts else np.empty(0, np.int64),
+            np.concatenate(ends) if ends else np.empty(0, np.int64),
+            np.concatenate(run_bytes) if run_bytes else np.empty(0, np.uint8),
+        )
+
+    def _codes(self, start, stop):
+        # Decode the 2-bit codes of bases [start, stop)
+        first = start // 4
+        quads = self.packed[first:(stop + 3) // 4]
+        codes = ((quads[:, None] >> _SHIFTS) & 3).ravel()
+        return codes[start - first * 4:stop - first * 4]
+
+    def _runs_between(self, start, stop):
+        # Indices of the ambiguity runs overlapping [start, stop)
+        return range(
+            int(np.searchsorted(self.run_ends, start, side="right")),
+            int(np.searchsorted(self.run_starts, stop, side="left")),
+        )
+
+    def unpack(self, start=0, stop=None):
+        """
+        Returns bases [start, stop) as ASCII bytes, ambiguity characters included.
+        """
+        stop = self.length if stop is None else min(stop, self.length)
+        start = min(start, stop)
+        bases = _BASE_TABLE[self._codes(start, stop)]
+        for run in self._runs_between(start, stop):
+            bases[max(self.run_starts[run], start) - start:min(self.run_ends[run], stop) - start] = self.run_bytes[run]
+        return bases.tobytes()
+
+    def symbols(self, start=0, stop=None):
+        """
+        Returns bases [start, stop) as automaton symbols (A=0, C=1, G=2, T=3, other=4).
+        """
+        stop = self.length if stop is None else min(stop, self.length)
+        start = min(start, stop)
+        codes = self._codes(start, stop)
+        for run in self._runs_between(start, stop):
+            codes[max(self.run_starts[run], start) - start:min(self.run_ends[run], stop) - start] = RESET_SYMBOL
+        return codes.tobytes()
+
+    def first_ambiguous(self):
+        """
+        Returns (offset, byte) of the first non-ACGT base, or None if there is none.
+        """
+        if not len(self.run_starts):
+            return None
+        return int(self.run_starts[0]), int(self.run_bytes[0])
+
+    def save(self, path):
+        """
+        Writes the packed sequence to a file, replacing it atomically.
+        """
+        temp_path = f"{path}.tmp{os.getpid()}"
+        with open(temp_path, "wb") as handle:
+            handle.write(_HEADER.pack(_MAGIC, self.length, len(self.run_starts)))
+            handle.write(np.asarray(self.run_starts, dtype="<i8").tobytes())
+            handle.write(np.asarray(self.run_ends, dtype="<i8").tobytes())
+            handle.write(np.asarray(self.run_bytes, dtype=np.uint8).tobytes())
+            handle.write(np.asarray(self.packed, dtype=np.uint8).tobytes())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, content_hash=None):
+        """
+        Memory-maps a packed sequence written by save(). The packed bases stay on disk
+        and in the OS page cache, so every session loading the same file shares them.
+        """
+        with open(path, "rb") as handle:
+            magic, length, run_count = _HEADER.unpack(handle.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"{path} is not a packed DNA sequence file.")
+            run_starts = np.frombuffer(handle.read(8 * run_count), dtype="<i8")
+            run_ends = np.frombuffer(handle.read(8 * run_count), dtype="<i8")
+            run_bytes = np.frombuffer(handle.read(run_count), dtype=np.uint8)
+        offset = _HEADER.size + 17 * run_count
+        packed_size = (length + 3) // 4
+        if packed_size:
+            packed = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(packed_size,))
+        else:
+            packed = np.empty(0, dtype=np.uint8)
+        return cls(packed, length, run_starts, run_ends, run_bytes, path=path, content_hash=content_hash)
+
+
+# Map a stored sequence again when it is unpickled, marking it as used so the store keeps it
+def _reopen(path, content_hash):
+    touch_entry(path)
+    return PackedSequence.load(path, content_hash)
+
+
+# SHA-256 of a sequence's bases, identifying its on-disk artifacts
+def sequence_hash(sequence):
+    """
+    Returns the content hash of a sequence (str, bytes, bytearray or PackedSequence).
+    Packed sequences from the store already know theirs; others are hashed in chunks.
+    """
+    if getattr(sequence, "content_hash", None):
+        return sequence.content_hash
+    if isinstance(sequence, str):
+        sequence = sequence.encode("ascii", errors="replace")
+    if not isinstance(sequence, PackedSequence):
+        return hashlib.sha256(sequence).hexdigest()
+    digest = hashlib.sha256()
+    for start in range(0, len(sequence), PACK_BLOCK_SIZE):
+        digest.update(sequence.unpack(start, start + PACK_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+# Read bases [start, stop) of a sequence as ASCII bytes
+def sequence_slice(sequence, start, stop):
+    """
+    Returns a slice of a str, bytes, bytearray or PackedSequence, unpacking only that
+    range of a PackedSequence so the rest of a memory-mapped genome is never read.
+    """
+    if isinstance(sequence, PackedSequence):
+        return sequence.unpack(start, stop)
+    if isinstance(sequence, str):
+        return sequence[start:stop].encode("ascii", errors="replace")
+    return bytes(sequence[start:stop])
+
+
+# Location of the packed sequence with the given content hash in the store
+def stored_sequence_path(content_hash, store_dir=SEQUENCE_STORE_DIR):
+    return os.path.join(store_dir, f"{content_hash}.2bit")
+
+
+# Pack a sequence into the shared on-disk store, keyed by its content hash
+def store_packed_sequence(sequence, store_dir=SEQUENCE_STORE_DIR, max_bytes=SEQUENCE_STORE_MAX_BYTES):
+    """
+    Packs a sequence into the store (unless it is already there) and memory-maps it.
+    Storing a new sequence evicts the least recently used ones beyond max_bytes.
+    Args:
+        sequence: DNA sequence as a str, bytes or bytearray.
+        store_dir: Directory holding packed sequence files.
+        max_bytes: Size limit of the store in bytes.
+    Returns:
+        Memory-mapped PackedSequence.
+    """
+    if isinstance(sequence, str):
+        sequence = sequence.encode("ascii", errors="replace")
+    digest = sequence_hash(sequence)
+    path = stored_sequence_path(digest, store_dir)
+    if os.path.exists(path):
+        touch_entry(path)
+    else:
+        os.makedirs(store_dir, exist_ok=True)
+        PackedSequence.from_bytes(sequence).save(path)
+        evict_least_recently_used(store_dir, max_bytes)
+    return PackedSequence.load(path, content_hash=digest)
+
+
+# Reopen a sequence packed by an earlier session, without re-reading its source
+def load_stored_sequence(content_hash, store_dir=SEQUENCE_STORE_DIR):
+    """
+    Returns the memory-mapped PackedSequence with this content hash, or None if the
+    store does not hold it (e.g. it was cleaned up).
+    """
+    path = stored_sequence_path(content_hash, store_dir)
+    if not os.path.exists(path):
+        return None
+    touch_entry(path)
+    try:
+        return PackedSequence.load(path, content_hash=content_hash)
+    except FileNotFoundError:
+        # Evicted between the check and the load
+        return None
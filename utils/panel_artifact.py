@@ -0,0 +1,85 @@
+import os
+import pickle
+import struct
+import sys
+
+from utils.store_cleanup import evict_least_recently_used, touch_entry
+
+
+# Default directory for compiled panels, one artifact per source content hash, and its
+# limits beyond which the least recently used artifacts are removed (every edit of a
+# hot-reloaded panel file compiles a new one)
+PANEL_ARTIFACT_DIR = "data/compiled_panels"
+PANEL_ARTIFACT_MAX_BYTES = 256 << 20
+PANEL_ARTIFACT_MAX_ENTRIES = 16
+
+# Bump whenever MarkerPanel or its matchers change layout; older artifacts are then recompiled
+ARTIFACT_VERSION = 3
+
+# File header: magic, artifact version and the SHA-256 hex digest of the source panel
+_MAGIC = b"DNAPANEL"
+_HEADER = struct.Struct("<8sI64s")
+
+
+# Location of the artifact compiled from a panel with the given content hash
+def artifact_path(content_hash, artifact_dir=PANEL_ARTIFACT_DIR):
+    return os.path.join(artifact_dir, f"{content_hash}.panel")
+
+
+# Write a compiled panel next to the others
+def save_panel_artifact(panel, artifact_dir=PANEL_ARTIFACT_DIR, max_bytes=PANEL_ARTIFACT_MAX_BYTES,
+                        max_entries=PANEL_ARTIFACT_MAX_ENTRIES):
+    """
+    Writes a compiled MarkerPanel (automaton, risks, descriptions and content hash)
+    to a versioned artifact, replacing it atomically, then evicts the least recently
+    used artifacts beyond max_bytes or max_entries.
+    Args:
+        panel: Compiled MarkerPanel.
+        artifact_dir: Directory holding one artifact per panel content hash.
+        max_bytes: Size limit of the directory in bytes.
+        max_entries: Limit on the number of artifacts kept.
+    Returns:
+        Path of the artifact.
+    """
+    path = artifact_path(panel.content_hash, artifact_dir)
+    os.makedirs(artifact_dir, exist_ok=True)
+    temp_path = f"{path}.tmp{os.getpid()}"
+    with open(temp_path, "wb") as handle:
+        handle.write(_HEADER.pack(_MAGIC, ARTIFACT_VERSION, panel.content_hash.encode("ascii")))
+        pickle.dump(panel, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+    evict_least_recently_used(artifact_dir, max_bytes, max_entries=max_entries)
+    return path
+
+
+# Load a compiled panel instead of recompiling its source
+def load_panel_artifact(content_hash, artifact_dir=PANEL_ARTIFACT_DIR):
+    """
+    Returns the MarkerPanel compiled from the source with this content hash, or None
+    if there is no artifact for it written by this ARTIFACT_VERSION.
+    """
+    path = artifact_path(content_hash, artifact_dir)
+    try:
+        with open(path, "rb") as handle:
+            header = handle.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return None
+            magic, version, stored_hash = _HEADER.unpack(header)
+            if magic != _MAGIC or version != ARTIFACT_VERSION or stored_hash != content_hash.encode("ascii"):
+                return None
+            panel = pickle.load(handle)
+    except FileNotFoundError:
+        return None
+    # Loading counts as a use, so the artifacts in use are the last ones evicted
+    touch_entry(path)
+    return panel
+
+
+if __name__ == "__main__":
+    # Compile step: python utils/panel_artifact.py [markers file]
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from utils.nucleotide_analysis import MARKERS_FILE, compile_marker_panel
+
+    source = sys.argv[1] if len(sys.argv) > 1 else MARKERS_FILE
+    compiled = compile_marker_panel(source)
+    print(f"Compiled {len(compiled.markers)} markers from {source} to {artifact_path(compiled.content_hash)}")
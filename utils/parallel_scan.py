@@ -0,0 +1,283 @@
+import multiprocessing
+import os
+from array import array
+from bisect import bisect_right
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+from utils.aho_corasick import ROOT_STATE, MarkerAutomaton, iter_symbol_chunks
+from utils.approximate_matching import ApproximateMatcher
+from utils.panel_artifact import PANEL_ARTIFACT_DIR, artifact_path, load_panel_artifact
+
+
+# Bases scanned by each worker task, not counting the overlap with the previous chunk;
+# sequences no longer than one chunk are scanned serially
+PARALLEL_CHUNK_SIZE = 1 << 22
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# Worker processes start from a clean forkserver process (spawn where there is none):
+# forking the multithreaded Streamlit server could copy locks held by other threads
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Modules the forkserver imports once, so every worker starts with them (including the
+# MarkerPanel class compiled panels unpickle into) already loaded
+FORKSERVER_PRELOAD = ["utils.parallel_scan", "utils.nucleotide_analysis"]
+
+# Per-process state set up once by _init_worker
+_worker = {}
+
+
+# Process pool whose workers start from the forkserver (also used to time its startup)
+def worker_pool(workers, initializer=None, initargs=()):
+    context = multiprocessing.get_context(POOL_START_METHOD)
+    if POOL_START_METHOD == "forkserver":
+        # Only takes effect before the first pool starts the forkserver
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=initializer,
+        initargs=initargs,
+    )
+
+
+# Attach a worker process to the sequence and load its matcher
+def _init_worker(source, matcher_source, max_distance, edit_distance):
+    kind, location = source
+    if kind == "packed":
+        # Packed sequences from the store are memory-mapped by every worker from the same file
+        from utils.packed_sequence import PackedSequence
+
+        _worker["sequence"] = PackedSequence.load(location)
+        _worker["memory"] = None
+    else:
+        _worker["memory"] = shared_memory.SharedMemory(name=location)
+    kind, location = matcher_source
+    if kind == "artifact":
+        # The compiled panel is unpickled instead of compiling its automaton again
+        panel = load_panel_artifact(*location)
+        if panel is None:
+            raise RuntimeError(f"The compiled panel {location[0]} is no longer on disk.")
+        _worker["matcher"] = panel.approximate_matcher(max_distance, edit_distance) if max_distance else panel.automaton
+    elif max_distance:
+        _worker["matcher"] = ApproximateMatcher(location, max_distance, edit_distance)
+    else:
+        _worker["matcher"] = MarkerAutomaton(location)
+
+
+# Symbols of bases [start, stop) of the sequence a worker is attached to
+def _worker_symbols(start, stop):
+    if _worker["memory"] is None:
+        return _worker["sequence"].symbols(start, stop)
+    return _worker["memory"].buf[start:stop]
+
+
+# Scan one chunk (plus the overlap before it) inside a worker process
+def _scan_window(window_start, chunk_start, chunk_stop, wanted=None):
+    matcher = _worker["matcher"]
+    symbols = _worker_symbols(window_start, chunk_stop)
+    try:
+        if wanted is not None:
+            # Any match inside the window is a real match, so overlaps need no deduplication
+            remaining = set(wanted)
+            if not remaining:
+                return set()
+            matched_states, _ = matcher.scan_presence(symbols, ROOT_STATE, None, remaining)
+            return matcher.pattern_ids(matched_states)
+        columns = [array("q"), array("q")]
+        if isinstance(matcher, ApproximateMatcher):
+            columns.append(array("b"))
+            matcher.scan(symbols, *columns, None, window_start)
+        else:
+            matcher.scan(symbols, *columns, ROOT_STATE, window_start)
+    finally:
+        if isinstance(symbols, memoryview):
+            symbols.release()
+    # Hits ending inside the overlap were already reported by the previous chunk
+    first = bisect_right(columns[1], chunk_start)
+    return [column[first:] for column in columns]
+
+
+# Scan sequence chunks in a process pool sharing one copy of the sequence
+def _scan_chunks(matcher, sequence, workers, chunk_size, wanted=None, panel_hash=None):
+    """
+    Yields (chunk start, chunk stop, result) as each worker task completes, so
+    callers can report progress (and be cancelled) without starting another pool.
+    Chunks not handed out yet are dropped when the caller stops iterating (close
+    the generator, e.g. with contextlib.closing), when an exception is raised at a
+    yield, or once every wanted pattern was seen; running ones finish their chunk.
+    """
+    # A match ends in exactly one chunk and starts at most (longest marker - 1 + distance)
+    # bases before its end, so each window reaches back that far into the previous chunk
+    max_distance = getattr(matcher, "max_distance", 0)
+    overlap = max(matcher.pattern_lengths, default=1) - 1 + max_distance
+    # Paths are absolute, since the workers start from the forkserver's working directory
+    artifact_dir = os.path.abspath(PANEL_ARTIFACT_DIR)
+    if panel_hash and os.path.exists(artifact_path(panel_hash, artifact_dir)):
+        matcher_source = ("artifact", (panel_hash, artifact_dir))
+    else:
+        matcher_source = ("patterns", matcher.patterns)
+    memory = None
+    pool = None
+    try:
+        if getattr(sequence, "path", None):
+            source = ("packed", os.path.abspath(sequence.path))
+        else:
+            # Anything else is translated once into symbols in shared memory
+            memory = shared_memory.SharedMemory(create=True, size=len(sequence))
+            offset = 0
+            for symbols in iter_symbol_chunks(sequence):
+                memory.buf[offset:offset + len(symbols)] = symbols
+                offset += len(symbols)
+            source = ("memory", memory.name)
+        chunk_starts = range(0, len(sequence), chunk_size)
+        pool = worker_pool(
+            min(workers, len(chunk_starts)),
+            _init_worker,
+            (source, matcher_source, max_distance, getattr(matcher, "edit_distance", False)),
+        )
+        futures = {}
+        for start in chunk_starts:
+            stop = min(start + chunk_size, len(sequence))
+            futures[pool.submit(_scan_window, max(start - overlap, 0), start, stop, wanted)] = (start, stop)
+        # Presence scans stop handing out chunks once every wanted pattern was seen
+        remaining = None if wanted is None else set(wanted)
+        for future in as_completed(futures):
+            result = future.result()
+            yield (*futures[future], result)
+            if remaining is not None:
+                remaining.difference_update(result)
+                if not remaining:
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if memory is not None:
+            memory.close()
+            memory.unlink()
+
+
+# Presence scan reporting the patterns found so far after every chunk
+def iter_find_present(automaton, sequence, workers=DEFAULT_WORKERS, chunk_size=PARALLEL_CHUNK_SIZE, wanted=None,
+                      panel_hash=None):
+    """
+    Scans the sequence in chunks of chunk_size bases, serially or (for several
+    workers and more than one chunk) in one process pool, and yields after each
+    chunk. Like find_present, it stops once every wanted pattern has been seen.
+    The arguments are those of parallel_find_present.
+    Returns:
+        Generator of (bases scanned, set of pattern ids found so far) tuples; the
+        bases scanned reach the sequence length once the scan is complete. Parallel
+        chunks complete in any order, so the bases scanned are a count, not a prefix.
+    """
+    length = len(sequence)
+    remaining = set(automaton.matchable_ids if wanted is None else wanted) & automaton.matchable_ids
+    if not remaining or not length:
+        yield length, set()
+        return
+    if workers <= 1 or length <= chunk_size:
+        matched_states = set()
+        state = ROOT_STATE
+        scanned = 0
+        for symbols in iter_symbol_chunks(sequence, chunk_size):
+            matched_states, state = automaton.scan_presence(symbols, state, matched_states, remaining)
+            scanned += len(symbols)
+            yield (scanned if remaining else length), automaton.pattern_ids(matched_states)
+            if not remaining:
+                return
+        return
+    found = set()
+    scanned = 0
+    with closing(_scan_chunks(automaton, sequence, workers, chunk_size, remaining, panel_hash)) as chunks:
+        for start, stop, pattern_ids in chunks:
+            found.update(pattern_ids)
+            remaining.difference_update(pattern_ids)
+            scanned += stop - start
+            yield (scanned if remaining else length), set(found)
+
+
+# Occurrence scan reporting the hits of every chunk as it completes
+def iter_find_all(matcher, sequence, workers=DEFAULT_WORKERS, chunk_size=PARALLEL_CHUNK_SIZE, panel_hash=None):
+    """
+    Scans the sequence in chunks of chunk_size bases, serially or (for several
+    workers and more than one chunk) in one process pool, and yields the hits
+    ending in each chunk. The arguments are those of parallel_find_all.
+    Returns:
+        Generator of (bases scanned, chunk start, columns) tuples, where the columns
+        are those of the matcher's find_all for the hits ending in that chunk.
+        Parallel chunks complete in any order.
+    """
+    approximate = isinstance(matcher, ApproximateMatcher)
+    if workers <= 1 or len(sequence) <= chunk_size:
+        state = None if approximate else ROOT_STATE
+        offset = 0
+        for symbols in iter_symbol_chunks(sequence, chunk_size):
+            columns = [array("q"), array("q")] + ([array("b")] if approximate else [])
+            state = matcher.scan(symbols, *columns, state, offset)
+            yield offset + len(symbols), offset, tuple(columns)
+            offset += len(symbols)
+        return
+    scanned = 0
+    with closing(_scan_chunks(matcher, sequence, workers, chunk_size, panel_hash=panel_hash)) as chunks:
+        for start, stop, columns in chunks:
+            scanned += stop - start
+            yield scanned, start, tuple(columns)
+
+
+# Parallel counterpart of MarkerAutomaton.find_present
+def parallel_find_present(automaton, sequence, workers=DEFAULT_WORKERS, chunk_size=PARALLEL_CHUNK_SIZE,
+                          wanted=None, panel_hash=None, progress=None):
+    """
+    Returns the set of pattern ids occurring anywhere in the sequence, scanning
+    overlapping chunks in a process pool. Like find_present, it stops once every
+    wanted pattern has been seen.
+    Args:
+        automaton: MarkerAutomaton to search with.
+        sequence: DNA sequence as a str, bytes, bytearray or PackedSequence.
+        workers: Number of worker processes; 1 scans serially.
+        chunk_size: Number of bases per worker task.
+        wanted: Pattern ids whose presence matters (every pattern if omitted).
+        panel_hash: Content hash of the MarkerPanel the automaton belongs to; workers
+            then load its compiled artifact instead of compiling the automaton again.
+        progress: Optional callback receiving (bases scanned, sequence length) after
+            every chunk; an exception it raises stops the scan.
+    """
+    found = set()
+    with closing(iter_find_present(automaton, sequence, workers, chunk_size, wanted, panel_hash)) as steps:
+        for scanned, found in steps:
+            if progress is not None:
+                progress(scanned, len(sequence))
+    return found
+
+
+# Parallel counterpart of MarkerAutomaton.find_all and ApproximateMatcher.find_all
+def parallel_find_all(matcher, sequence, workers=DEFAULT_WORKERS, chunk_size=PARALLEL_CHUNK_SIZE, panel_hash=None,
+                      progress=None):
+    """
+    Returns every occurrence in the sequence, scanning overlapping chunks in a
+    process pool. The columns are identical to the matcher's own find_all.
+    Args:
+        matcher: MarkerAutomaton or ApproximateMatcher to search with.
+        sequence: DNA sequence as a str, bytes, bytearray or PackedSequence.
+        workers: Number of worker processes; 1 scans serially.
+        chunk_size: Number of bases per worker task.
+        panel_hash: Content hash of the MarkerPanel the matcher belongs to; workers
+            then load its compiled artifact instead of compiling the matcher again.
+        progress: Optional callback receiving (bases scanned, sequence length) after
+            every chunk; an exception it raises stops the scan.
+    Returns:
+        Tuple of array.array columns, ordered by end position.
+    """
+    chunk_columns = {}
+    with closing(iter_find_all(matcher, sequence, workers, chunk_size, panel_hash)) as steps:
+        for scanned, start, columns in steps:
+            chunk_columns[start] = columns
+            if progress is not None:
+                progress(scanned, len(sequence))
+    merged = [array("q"), array("q")] + ([array("b")] if isinstance(matcher, ApproximateMatcher) else [])
+    for start in sorted(chunk_columns):
+        for column, chunk_column in zip(merged, chunk_columns[start]):
+            column.extend(chunk_column)
+    return tuple(merged)
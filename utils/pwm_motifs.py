@@ -0,0 +1,126 @@
+import numpy as np
+from utils.aho_corasick import ALPHABET, symbols_between
+from utils.marker_hits import MarkerHits, FORWARD_STRAND, REVERSE_STRAND
+
+
+# Bases scored per block; each block is read with the motif length - 1 bases after it
+MOTIF_BLOCK_SIZE = 1 << 22
+
+
+# Parse a "Motif Matrix" panel cell into a position weight matrix
+def parse_motif_matrix(text):
+    """
+    Parses a position weight matrix written as four rows of weights, one per base
+    in A|C|G|T order, e.g. "0.9 -1 0.2|-1 0.8 0|...". Weights are log-odds scores
+    added up over the bases of each window.
+    Args:
+        text: Matrix cell of a marker panel.
+    Returns:
+        float64 array of shape (motif length, 4).
+    """
+    rows = [row.split() for row in str(text).split("|")]
+    if len(rows) != len(ALPHABET) or not rows[0] or any(len(row) != len(rows[0]) for row in rows):
+        raise ValueError(f"Invalid motif matrix '{text}': expected 4 rows (A|C|G|T) of equal length.")
+    try:
+        return np.array(rows, dtype=np.float64).T
+    except ValueError:
+        raise ValueError(f"Invalid motif matrix '{text}': weights must be numbers.") from None
+
+
+class MotifScorer:
+    """
+    Scores position weight matrix (PWM) motifs at every position of a sequence.
+
+    Each matrix gets a fifth column of -inf for N and other bases, so looking a
+    base's symbol (A=0, C=1, G=2, T=3, other=4) up in it gives that position's
+    weight. A motif of length L is then scored over a whole block of the sequence
+    with L vectorized lookups and additions instead of a Python loop over windows,
+    and windows containing an N can never reach the threshold.
+
+    Motif ids are the marker ids they were given with; the reverse strand is
+    scored with the reverse-complement matrix.
+    """
+
+    def __init__(self, motif_ids, matrices, thresholds):
+        self.motif_ids = list(motif_ids)
+        self.thresholds = [float(threshold) for threshold in thresholds]
+        self.forward = []
+        self.reverse = []
+        for matrix in matrices:
+            weights = np.full((len(matrix), len(ALPHABET) + 1), -np.inf)
+            weights[:, :len(ALPHABET)] = matrix
+            self.forward.append(weights)
+            # Reverse complement: last position first, A<->T and C<->G swapped
+            reverse = weights[::-1].copy()
+            reverse[:, :len(ALPHABET)] = reverse[:, len(ALPHABET) - 1::-1]
+            self.reverse.append(reverse)
+        self.max_length = max((len(matrix) for matrix in matrices), default=0)
+
+    def __len__(self):
+        return len(self.motif_ids)
+
+    def _iter_block_hits(self, sequence, both_strands):
+        # Yields (block end, motif index, strand, start positions) for every block of the sequence
+        length = len(sequence)
+        strands = [(FORWARD_STRAND, self.forward)]
+        if both_strands:
+            strands.append((REVERSE_STRAND, self.reverse))
+        for start in range(0, length, MOTIF_BLOCK_SIZE):
+            stop = min(start + MOTIF_BLOCK_SIZE, length)
+            codes = np.frombuffer(symbols_between(sequence, start, stop + self.max_length - 1), dtype=np.uint8)
+            for motif, threshold in enumerate(self.thresholds):
+                for strand, matrices in strands:
+                    weights = matrices[motif]
+                    # Windows starting in this block that fit in the sequence
+                    window_count = min(stop, length - len(weights) + 1) - start
+                    if window_count <= 0:
+                        continue
+                    # Add weights in motif order (last row first on the reverse strand), so a
+                    # site scores exactly the same on either strand
+                    offsets = range(len(weights)) if strand == FORWARD_STRAND else range(len(weights) - 1, -1, -1)
+                    scores = np.zeros(window_count)
+                    for offset in offsets:
+                        scores += weights[offset][codes[offset:offset + window_count]]
+                    yield stop, motif, strand, np.flatnonzero(scores >= threshold) + start
+
+    def find_present(self, sequence, both_strands=False):
+        """
+        Returns the set of (marker id, strand) pairs scoring at or above their threshold
+        anywhere in the sequence.
+        """
+        found = set()
+        for _, found in self.iter_present(sequence, both_strands):
+            pass
+        return found
+
+    def iter_present(self, sequence, both_strands=False):
+        """
+        Runs find_present block by block, yielding (bases scored, set of (marker id,
+        strand) pairs found so far) after each block of MOTIF_BLOCK_SIZE bases.
+        """
+        found = set()
+        wanted = len(self.motif_ids) * (2 if both_strands else 1)
+        block_stop = 0
+        for stop, motif, strand, starts in self._iter_block_hits(sequence, both_strands):
+            if stop != block_stop and block_stop:
+                yield block_stop, set(found)
+            block_stop = stop
+            if len(starts):
+                found.add((self.motif_ids[motif], strand))
+                # Every motif seen on every strand: the rest of the sequence cannot add anything
+                if len(found) == wanted:
+                    break
+        yield len(sequence), found
+
+    def locate(self, sequence, both_strands=False):
+        """
+        Returns every window scoring at or above its motif's threshold as MarkerHits.
+        """
+        marker_ids, starts, strands = [], [], []
+        for _, motif, strand, block_starts in self._iter_block_hits(sequence, both_strands):
+            marker_ids.append(np.full(len(block_starts), self.motif_ids[motif], dtype=np.int32))
+            starts.append(block_starts)
+            strands.append(np.full(len(block_starts), strand, dtype=np.int8))
+        if not starts:
+            return MarkerHits([], [], [])
+        return MarkerHits(np.concatenate(marker_ids), np.concatenate(starts), np.concatenate(strands))
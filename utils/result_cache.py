@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import time
+
+
+# Default location and size limit of the on-disk result cache
+RESULT_CACHE_PATH = "data/result_cache.sqlite3"
+RESULT_CACHE_MAX_BYTES = 256 << 20
+
+# Bump whenever a cached value changes shape (e.g. MarkerHits columns); older entries are then never hit
+RESULT_CACHE_VERSION = 1
+
+# Number of bytes hashed at a time by file_content_hash
+HASH_CHUNK_SIZE = 1 << 20
+
+_MISSING = object()
+
+logger = logging.getLogger(__name__)
+
+
+# SHA-256 of an uploaded file's raw bytes
+def file_content_hash(fileobj, chunk_size=HASH_CHUNK_SIZE, progress=None):
+    """
+    Hashes a binary file object from the start, leaving it rewound. The optional
+    progress callback receives (bytes hashed, file size) after every chunk.
+    """
+    digest = hashlib.sha256()
+    total = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(0)
+    hashed = 0
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+        hashed += len(chunk)
+        if progress is not None:
+            progress(hashed, total)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of analysis results in a SQLite file, shared by every
+    session and kept across restarts.
+
+    Keys are tuples of content hashes and options (e.g. ("detections", sequence
+    hash, panel hash, scan options)), so the same sample analyzed the same way hits
+    the cache whoever uploads it. Values are pickled. Once the stored values exceed
+    max_bytes, the least recently used ones are evicted.
+
+    Every call opens its own connection, so one instance can be shared between
+    threads. If the database cannot be used (e.g. a read-only data directory), the
+    cache logs a warning and behaves as if it were empty.
+    """
+
+    def __init__(self, path=RESULT_CACHE_PATH, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        return connection
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.sha256(json.dumps([RESULT_CACHE_VERSION, key], sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored under a key (refreshing its last use), or default.
+        """
+        digest = self._digest(key)
+        try:
+            connection = self._connect()
+            try:
+                with connection:
+                    row = connection.execute("SELECT value FROM results WHERE key = ?", (digest,)).fetchone()
+                    if row is None:
+                        return default
+                    connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), digest))
+            finally:
+                connection.close()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Result cache %s is unavailable: %s", self.path, e)
+            return default
+        return pickle.loads(row[0])
+
+    def contains(self, key):
+        """
+        Returns True if a value is stored under a key, without loading it.
+        """
+        try:
+            connection = self._connect()
+            try:
+                row = connection.execute("SELECT 1 FROM results WHERE key = ?", (self._digest(key),)).fetchone()
+            finally:
+                connection.close()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Result cache %s is unavailable: %s", self.path, e)
+            return False
+        return row is not None
+
+    def put(self, key, value):
+        """
+        Stores a value under a key, then evicts least recently used values beyond max_bytes.
+        """
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        try:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                        (self._digest(key), blob, len(blob), time.time()),
+                    )
+                    self._evict(connection)
+            finally:
+                connection.close()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Result cache %s is unavailable: %s", self.path, e)
+
+    def _evict(self, connection):
+        # Keep the most recently used values that fit in max_bytes
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for digest, size in connection.execute("SELECT key, size FROM results ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((digest,))
+            total -= size
+        connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the value stored under a key, computing and storing it on a miss.
+        Args:
+            key: JSON-serializable tuple identifying the result.
+            compute: Function without arguments producing the result.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
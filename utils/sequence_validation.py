@@ -0,0 +1,80 @@
+import numpy as np
+from utils.packed_sequence import PackedSequence
+
+
+VALID_BASES = b"ATCG"
+
+INVALID_SEQUENCE_MESSAGE = "Invalid DNA sequence detected! Ensure the sequence contains only A, T, C, and G."
+
+# Number of bases checked per block, keeping the temporary mask small
+VALIDATION_BLOCK_SIZE = 1 << 22
+
+# Lookup table flagging every byte value that is not a valid base
+_INVALID_BYTE = np.ones(256, dtype=bool)
+_INVALID_BYTE[np.frombuffer(VALID_BASES, dtype=np.uint8)] = False
+
+
+class InvalidSequenceError(ValueError):
+    """
+    Raised when a sequence contains something other than A, T, C and G.
+    Carries the 0-based offset and the offending character of the first invalid base.
+    """
+
+    def __init__(self, offset, character, record_id=None):
+        self.offset = offset
+        self.character = character
+        self.record_id = record_id
+        location = f"position {offset + 1}"
+        if record_id is not None:
+            location += f" of record '{record_id}'"
+        super().__init__(f"{INVALID_SEQUENCE_MESSAGE} Found '{character}' at {location}.")
+
+
+# Printable form of a byte for error messages
+def describe_byte(byte):
+    return chr(byte) if 32 <= byte < 127 else f"\\x{byte:02x}"
+
+
+# Find the first byte that is not a valid base
+def find_invalid_base(sequence):
+    """
+    Scans a sequence with a vectorized lookup table.
+    Args:
+        sequence: DNA sequence as a str, bytes, bytearray, memoryview or PackedSequence.
+    Returns:
+        Offset of the first invalid base, or -1 if every base is A, T, C or G.
+    """
+    # Packed sequences already track their non-ACGT bases in the run table
+    if isinstance(sequence, PackedSequence):
+        first = sequence.first_ambiguous()
+        return -1 if first is None else first[0]
+    if isinstance(sequence, str):
+        sequence = sequence.encode("ascii", errors="replace")
+    data = np.frombuffer(sequence, dtype=np.uint8)
+    for start in range(0, len(data), VALIDATION_BLOCK_SIZE):
+        invalid = _INVALID_BYTE[data[start:start + VALIDATION_BLOCK_SIZE]]
+        if invalid.any():
+            return start + int(invalid.argmax())
+    return -1
+
+
+# Validate a sequence, raising on the first invalid base
+def validate_sequence(sequence, offset=0, record_id=None):
+    """
+    Checks that a sequence only contains A, T, C and G.
+    Args:
+        sequence: DNA sequence as a str, bytes, bytearray, memoryview or PackedSequence.
+        offset: Position of the sequence within its record, used in the error.
+        record_id: Record the sequence belongs to, used in the error.
+    Raises:
+        InvalidSequenceError: Pointing at the first invalid base.
+    """
+    index = find_invalid_base(sequence)
+    if index != -1:
+        if isinstance(sequence, PackedSequence):
+            character = sequence.first_ambiguous()[1]
+        else:
+            character = sequence[index]
+        if not isinstance(character, str):
+            character = describe_byte(character)
+        raise InvalidSequenceError(offset + index, character, record_id)
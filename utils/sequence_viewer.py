@@ -0,0 +1,39 @@
+from utils.packed_sequence import sequence_slice
+
+
+# Bases per line of the sequence viewer
+VIEWER_LINE_WIDTH = 60
+
+
+# First base of the window showing a position in the middle, aligned to a line start
+def window_start_around(position, width, sequence_length, line_width=VIEWER_LINE_WIDTH):
+    start = max(0, min(position - width // 2, sequence_length - width))
+    return start - start % line_width
+
+
+# Format one window of a sequence as numbered lines
+def format_sequence_window(sequence, start, width, highlight=None, line_width=VIEWER_LINE_WIDTH):
+    """
+    Formats the bases of one window of the sequence as lines prefixed with the
+    1-based position of their first base. Only the window is read, so the text
+    has the same size however long the sequence is.
+    Args:
+        sequence: DNA sequence as a str, bytes, bytearray or PackedSequence.
+        start: 0-based position of the first base shown.
+        width: Number of bases shown.
+        highlight: Optional 0-based (start, end) range printed in lowercase, e.g. a marker hit.
+        line_width: Number of bases per line.
+    Returns:
+        Window text, one line per line_width bases.
+    """
+    stop = min(start + width, len(sequence))
+    bases = bytearray(sequence_slice(sequence, start, stop))
+    if highlight is not None:
+        first, last = max(highlight[0], start), min(highlight[1], stop)
+        if first < last:
+            bases[first - start:last - start] = bases[first - start:last - start].lower()
+    number_width = len(str(max(stop, 1)))
+    return "\n".join(
+        f"{start + offset + 1:>{number_width}} {bases[offset:offset + line_width].decode('ascii')}"
+        for offset in range(0, len(bases), line_width)
+    )
@@ -0,0 +1,78 @@
+import logging
+import os
+import shutil
+import time
+
+
+# Entries used within this many seconds are never evicted: a running analysis or a
+# stage cache may still be reading them
+STORE_MIN_IDLE = 3600.0
+
+logger = logging.getLogger(__name__)
+
+
+# Mark a store entry (file or directory) as just used
+def touch_entry(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+# Bytes used by a store entry, counting every file of a directory entry
+def _entry_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+# Keep an on-disk store within its limits
+def evict_least_recently_used(store_dir, max_bytes, min_idle=STORE_MIN_IDLE, max_entries=None):
+    """
+    Removes the least recently used entries of a store (files or directories named
+    by content hash) until the others fit in max_bytes (and number at most
+    max_entries). An entry's last use is its modification time, which touch_entry
+    refreshes whenever it is reused.
+    Args:
+        store_dir: Directory holding the store's entries.
+        max_bytes: Size limit of the store in bytes.
+        min_idle: Entries used within this many seconds are kept even over the limits.
+        max_entries: Optional limit on the number of entries.
+    Returns:
+        List of the paths removed.
+    """
+    entries = []
+    try:
+        with os.scandir(store_dir) as scan:
+            for entry in scan:
+                # Entries still being written are renamed into place once complete
+                if ".tmp" in entry.name:
+                    continue
+                try:
+                    entries.append((entry.stat().st_mtime, _entry_size(entry.path), entry.path))
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        return []
+    total = sum(size for _, size, _ in entries)
+    count = len(entries)
+    removed = []
+    now = time.time()
+    for last_used, size, path in sorted(entries):
+        within_limits = total <= max_bytes and (max_entries is None or count <= max_entries)
+        if within_limits or now - last_used < min_idle:
+            break
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError as e:
+            logger.warning("Could not evict %s from the store: %s", path, e)
+            continue
+        total -= size
+        count -= 1
+        removed.append(path)
+    if removed:
+        logger.info("Evicted %d least recently used entries from %s", len(removed), store_dir)
+    return removed
@@ -1,16 +1,96 @@
-import matplotlib.pyplot as plt
+from io import BytesIO
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+# Resolution of rendered charts
+RENDER_DPI = 100
+
+
+# Function to create a figure drawn by the Agg backend, outside pyplot's global state
+def _agg_figure(figsize):
+    # Figures created this way are never registered with pyplot, so concurrent sessions
+    # do not share a "current figure" and nothing is left open after rendering
+    fig = Figure(figsize=figsize, dpi=RENDER_DPI)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+# Function to render a figure to PNG bytes and close it
+def render_png(fig):
+    """
+    Renders a figure with its Agg canvas and releases it.
+    Args:
+        fig: Figure from one of the plot functions.
+    Returns:
+        PNG image bytes.
+    """
+    try:
+        buffer = BytesIO()
+        fig.canvas.print_png(buffer)
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+
+# Function to visualize the top detected risks
+def plot_top_risks(top_markers):
+    """
+    Visualizes the top 3 detected genetic risk factors for heart disease from uploaded DNA sequence analysis.
+    Args:
+        top_markers: Detected markers (with "Description" and "Associated Risk"), highest risk first.
+    Returns:
+        matplotlib Figure.
+    """
+    fig, ax = _agg_figure(figsize=(10, 6))
+
+    # Truncate long descriptions to ensure clarity
+    risks = [
+        m["Description"][:20] + "..." if len(m["Description"]) > 20 else m["Description"] for m in top_markers
+    ]
+    scores = [m["Associated Risk"] for m in top_markers]
+
+    # Create bar graph
+    bars = ax.bar(risks, scores, color=["#FF6F61", "#6B8E23", "#4682B4"])
+
+    # Set graph details
+    ax.set_title(
+        "Top 3 Detected Genetic Risk Factors for Heart Disease", fontsize=12
+    )
+    ax.set_xlabel("Risk Factors", fontsize=10)
+    ax.set_ylabel("Risk Score", fontsize=10)
+    ax.set_ylim(0, 1.0)
+
+    # Annotate scores
+    for bar, score in zip(bars, scores):
+        ax.text(
+            bar.get_x() + bar.get_width() / 2,
+            bar.get_height() - 0.05 if bar.get_height() > 0.1 else bar.get_height() + 0.02,
+            f"{score:.2f}",
+            ha="center",
+            fontsize=8,
+        )
+
+    # Improve layout for visual clarity
+    fig.tight_layout()
+    return fig
 
 
 # Function to visualize top risks without overlapping names
 def plot_overall_risk_gauge(risk_summary):
     """
     Visualizes the top 3 heart disease risks in a bar graph without overlapping risk names.
+    Args:
+        risk_summary: Dictionary mapping risk names to scores.
+    Returns:
+        matplotlib Figure.
     """
     # Ensure the data is valid
     if not risk_summary or not isinstance(risk_summary, dict):
-        fig, ax = plt.subplots(figsize=(8, 4))
+        fig, ax = _agg_figure(figsize=(8, 4))
         ax.set_title("No data to display", fontsize=10)
-        return plt
+        return fig
 
     # Sort and limit to top 3 risks for visualization
     sorted_risks = sorted(risk_summary.items(), key=lambda x: x[1], reverse=True)[:3]
@@ -29,7 +109,7 @@ def plot_overall_risk_gauge(risk_summary):
     scores = [score for _, score in sorted_risks]
 
     # Create the bar graph with better visual spacing
-    fig, ax = plt.subplots(figsize=(12, 6))
+    fig, ax = _agg_figure(figsize=(12, 6))
     bars = ax.bar(risks, scores, color=["red", "orange", "blue"])
 
     # Set main attributes
@@ -38,8 +118,10 @@ def plot_overall_risk_gauge(risk_summary):
     ax.set_title("Top 3 Heart Disease Risk Factors from Genetic Data", fontsize=14)
 
     # Avoid overlap by ensuring tick properties are spaced well
-    ax.tick_params(axis="x", labelsize=10, rotation=30, ha="right")
+    ax.tick_params(axis="x", labelsize=10, rotation=30)
     ax.tick_params(axis="y", labelsize=10)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment("right")
 
     # Annotate bars with their respective scores dynamically
     for bar in bars:
@@ -57,4 +139,4 @@ def plot_overall_risk_gauge(risk_summary):
     # Improve layout spacing
     fig.tight_layout()
 
-    return plt
+    return fig